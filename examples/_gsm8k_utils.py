@@ -0,0 +1,77 @@
+"""
+Shared GSM8K answer-parsing and reward helpers for the example loops.
+
+One canonical copy of the precompiled regexes and no-exception checks used
+by gsm8k_rl.py, gsm8k_with_logprobs.py and rl_loop.py.
+"""
+
+import re
+
+_BOXED_RE = re.compile(r"\\boxed\{([^}]+)\}")
+_GSM8K_ANS_RE = re.compile(r"####\s*([\d,]+)")
+
+
+def find_boxed(text: str) -> str | None:
+    """Return the \\boxed{...} answer, or None if absent."""
+    match = _BOXED_RE.search(text)
+    return match.group(1).strip() if match else None
+
+
+def extract_boxed(text: str) -> str:
+    """Extract answer from \\boxed{...} format."""
+    boxed = find_boxed(text)
+    if boxed is None:
+        raise ValueError("No boxed answer found")
+    return boxed
+
+
+def check_format(response: str) -> bool:
+    """Check if response has \\boxed{} format."""
+    return find_boxed(response) is not None
+
+
+def extract_gsm8k_answer(answer_text: str) -> str:
+    """Extract numeric answer from GSM8K answer field."""
+    match = _GSM8K_ANS_RE.search(answer_text)
+    if match:
+        return match.group(1).replace(",", "")
+    return answer_text.strip()
+
+
+def parse_gold_answer(answer_text: str) -> tuple[float | None, str]:
+    """Parse a gold answer once into (numeric value or None, cleaned lowercase string)."""
+    ans_clean = extract_gsm8k_answer(answer_text).replace(",", "").strip()
+    try:
+        return float(ans_clean), ans_clean.lower()
+    except ValueError:
+        return None, ans_clean.lower()
+
+
+def check_correct(response: str, gold: tuple[float | None, str]) -> bool:
+    """Check if extracted answer matches a pre-parsed gold answer."""
+    pred = find_boxed(response)
+    if pred is None:
+        return False
+    pred_clean = pred.replace(",", "").strip()
+    gold_num, gold_str = gold
+    if gold_num is not None:
+        # GSM8K gold answers are numeric: an unparseable prediction is simply wrong,
+        # so skip the lowercase string fallback entirely
+        try:
+            return abs(float(pred_clean) - gold_num) < 1e-6
+        except ValueError:
+            return False
+    return pred_clean.lower() == gold_str
+
+
+def compute_reward(response: str, gold: tuple[float | None, str]) -> tuple[float, dict]:
+    """Compute reward: 1[correct] + 0.1 * (1[formatted] - 1)"""
+    is_formatted = check_format(response)
+    is_correct = check_correct(response, gold) if is_formatted else False
+    reward = float(is_correct) + 0.1 * (float(is_formatted) - 1)
+    return reward, {"format": float(is_formatted), "correct": float(is_correct)}
+
+
+def get_reward(response: str, gold: tuple[float | None, str]) -> float:
+    """Compute reward: 1.0 if correct, 0.0 otherwise."""
+    return 1.0 if check_correct(response, gold) else 0.0
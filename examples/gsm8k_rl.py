@@ -13,65 +13,17 @@ Usage:
     python examples/gsm8k_rl.py
 """
 
-import re
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 import tinker
 from tinker import types
 from datasets import load_dataset
 from transformers import AutoTokenizer
 
-from tviz import TvizLogger
-
-
-# =============================================================================
-# GSM8K Utilities
-# =============================================================================
+from _gsm8k_utils import compute_reward, parse_gold_answer
 
-def extract_boxed(text: str) -> str:
-    """Extract answer from \\boxed{...} format."""
-    match = re.search(r"\\boxed\{([^}]+)\}", text)
-    if match:
-        return match.group(1).strip()
-    raise ValueError("No boxed answer found")
-
-
-def check_format(response: str) -> bool:
-    """Check if response has \\boxed{} format."""
-    try:
-        extract_boxed(response)
-        return True
-    except ValueError:
-        return False
-
-
-def check_correct(response: str, answer: str) -> bool:
-    """Check if extracted answer matches ground truth."""
-    try:
-        pred = extract_boxed(response)
-        pred_clean = pred.replace(",", "").strip()
-        ans_clean = answer.replace(",", "").strip()
-        try:
-            return abs(float(pred_clean) - float(ans_clean)) < 1e-6
-        except ValueError:
-            return pred_clean.lower() == ans_clean.lower()
-    except ValueError:
-        return False
-
-
-def compute_reward(response: str, answer: str) -> tuple[float, dict]:
-    """Compute reward: 1[correct] + 0.1 * (1[formatted] - 1)"""
-    is_formatted = check_format(response)
-    is_correct = check_correct(response, answer) if is_formatted else False
-    reward = float(is_correct) + 0.1 * (float(is_formatted) - 1)
-    return reward, {"format": float(is_formatted), "correct": float(is_correct)}
-
-
-def extract_gsm8k_answer(answer_text: str) -> str:
-    """Extract numeric answer from GSM8K answer field."""
-    match = re.search(r"####\s*([\d,]+)", answer_text)
-    if match:
-        return match.group(1).replace(",", "")
-    return answer_text.strip()
+from tviz import TvizLogger
 
 
 # =============================================================================
@@ -87,6 +39,9 @@ def main():
     learning_rate = 4e-5
     max_tokens = 256
 
+    # Persistent RNG (cheaper than the legacy np.random.* dispatch per call)
+    rng = np.random.default_rng()
+
     # Setup tviz
     logger = TvizLogger(run_name="gsm8k_rl")
     logger.log_hparams({
@@ -98,6 +53,10 @@ def main():
     })
     print(f"View training at: {logger.get_logger_url()}")
 
+    # Single-worker executor so SQLite writes never stall the training loop;
+    # ordering is preserved because all submissions share one worker
+    log_executor = ThreadPoolExecutor(max_workers=1)
+
     # Setup Tinker
     service_client = tinker.ServiceClient()
     training_client = service_client.create_lora_training_client(
@@ -107,8 +66,12 @@ def main():
     tokenizer = AutoTokenizer.from_pretrained(model_name)
 
     # Load GSM8K
+    # Keep the Arrow-backed dataset; random access is O(1) without materializing dicts
     dataset = load_dataset("gsm8k", "main", split="train")
-    problems = list(dataset)
+    problems = dataset
+
+    # Parse every gold answer once so reward checks are a float compare
+    gold_answers = [parse_gold_answer(answer) for answer in dataset["answer"]]
 
     # Few-shot prefix
     fewshot_prefix = (
@@ -117,104 +80,150 @@ def main():
         "The letter 'r' appears at positions 3, 8, and 9. \\boxed{3}\n\n"
     )
 
-    # Training loop
-    for step in range(num_steps):
-        # Get sampling client with current weights
-        sampling_client = training_client.save_weights_and_get_sampling_client(name=f"step_{step}")
-
-        # Sample batch of problems
-        batch_indices = np.random.choice(len(problems), batch_size, replace=False)
-        batch = [problems[i] for i in batch_indices]
+    # Prompt encodings are immutable per problem - tokenize each at most once
+    prompt_token_cache: list = [None] * len(problems)
 
-        all_rewards = []
-        all_correct = []
-        all_format = []
-        training_data = []
+    # Sampling parameters never change; build them once, not per prompt
+    sampling_params = types.SamplingParams(
+        max_tokens=max_tokens,
+        temperature=0.7,
+        stop=["\n\nUser:", "\n\n\n"],
+    )
 
-        for problem in batch:
-            question = problem["question"] + " Write your answer in \\boxed{} format."
-            answer = extract_gsm8k_answer(problem["answer"])
+    def request_batch(sampling_client):
+        """Draw a batch and issue its sampling requests without waiting on them."""
+        batch_indices = rng.choice(len(problems), batch_size, replace=False)
+
+        # Batch-tokenize only problems we have not seen before
+        answers = [gold_answers[i] for i in batch_indices]
+        new_indices = [i for i in batch_indices if prompt_token_cache[i] is None]
+        if new_indices:
+            new_texts = [
+                fewshot_prefix
+                + f"User: {problems[int(i)]['question']} Write your answer in \\boxed{{}} format.\n\nAssistant:"
+                for i in new_indices
+            ]
+            for i, tokens in zip(new_indices, tokenizer(new_texts)["input_ids"]):
+                prompt_token_cache[i] = tokens
+        batch_prompt_tokens = [prompt_token_cache[i] for i in batch_indices]
 
-            # Build prompt
-            prompt_text = fewshot_prefix + f"User: {question}\n\nAssistant:"
-            prompt_tokens = tokenizer.encode(prompt_text)
+        # Issue all sampling requests up front so groups sample concurrently
+        sample_futures = []
+        for prompt_tokens in batch_prompt_tokens:
             prompt = types.ModelInput.from_ints(prompt_tokens)
-
-            # Sample multiple completions (group)
-            params = types.SamplingParams(
-                max_tokens=max_tokens,
-                temperature=0.7,
-                stop=["\n\nUser:", "\n\n\n"],
+            sample_futures.append(
+                sampling_client.sample(
+                    prompt=prompt,
+                    sampling_params=sampling_params,
+                    num_samples=group_size,
+                    include_prompt_logprobs=True,
+                )
             )
-            result = sampling_client.sample(
-                prompt=prompt,
-                sampling_params=params,
-                num_samples=group_size,
-                include_prompt_logprobs=True,
-            ).result()
+        return answers, batch_prompt_tokens, sample_futures
+
+    # Pipelined training loop: while step N runs its forward/backward, the
+    # rollouts for step N+1 are already sampling against the pre-update
+    # checkpoint, hiding sampling latency behind training latency
+    sampling_client = training_client.save_weights_and_get_sampling_client(name="step_0")
+    pending_batch = request_batch(sampling_client)
+
+    for step in range(num_steps):
+        answers, batch_prompt_tokens, sample_futures = pending_batch
+
+        # SoA layout: parallel per-trajectory lists, metrics in preallocated buffers
+        n_traj = batch_size * group_size
+        rewards = np.empty(n_traj, np.float32)
+        all_correct = np.empty(n_traj, np.float32)
+        all_format = np.empty(n_traj, np.float32)
+        tokens_list = []
+        prompt_lens = []
+        ti = 0
+
+        for answer, prompt_tokens, future in zip(answers, batch_prompt_tokens, sample_futures):
+            result = future.result()
 
             # Compute rewards and collect training data
-            group_rewards = []
             for seq in result.sequences:
                 response = tokenizer.decode(seq.tokens)
                 reward, metrics = compute_reward(response, answer)
-                group_rewards.append(reward)
-                all_rewards.append(reward)
-                all_correct.append(metrics["correct"])
-                all_format.append(metrics["format"])
+                rewards[ti] = reward
+                all_correct[ti] = metrics["correct"]
+                all_format[ti] = metrics["format"]
+                ti += 1
 
                 # Build training datum with full sequence
-                full_tokens = prompt_tokens + list(seq.tokens)
-                weights = [0] * len(prompt_tokens) + [1] * len(seq.tokens)
-
-                training_data.append({
-                    "tokens": full_tokens,
-                    "weights": weights,
-                    "reward": reward,
-                })
-
-            # Compute advantages (GRPO: reward - mean)
-            mean_reward = np.mean(group_rewards)
-            for i, td in enumerate(training_data[-group_size:]):
-                td["advantage"] = td["reward"] - mean_reward
-
-        # Filter to positive advantages only (simplified GRPO)
-        positive_data = [td for td in training_data if td["advantage"] > 0]
-
-        if positive_data:
+                tokens_list.append(prompt_tokens + list(seq.tokens))
+                prompt_lens.append(len(prompt_tokens))
+
+        # Compute advantages for the whole batch at once (GRPO: reward - group mean)
+        advantages = rewards.reshape(-1, group_size)
+        advantages = (advantages - advantages.mean(axis=1, keepdims=True)).ravel()
+
+        # All-equal groups (common early in training, e.g. all wrong) yield no
+        # positive advantages; skip the forward/backward round-trip entirely
+        if advantages.max() > 0:
+            # Filter to positive advantages only (simplified GRPO)
+            pos_indices = np.flatnonzero(advantages > 0)
             # Build Datum objects for training
-            data = [
-                types.Datum(
-                    model_input=types.ModelInput.from_ints(tokens=td["tokens"][:-1]),
-                    loss_fn_inputs=dict(
-                        weights=[w * td["advantage"] for w in td["weights"][1:]],
-                        target_tokens=td["tokens"][1:],
-                    ),
+            data = []
+            for i in pos_indices:
+                tokens = tokens_list[i]
+                # 0/1 mask times advantage is just advantage on completion positions
+                weights = np.zeros(len(tokens) - 1, np.float32)
+                weights[prompt_lens[i] - 1 :] = advantages[i]
+                data.append(
+                    types.Datum(
+                        model_input=types.ModelInput.from_ints(tokens=tokens[:-1]),
+                        loss_fn_inputs=dict(
+                            weights=weights.tolist(),
+                            target_tokens=tokens[1:],
+                        ),
+                    )
                 )
-                for td in positive_data
-            ]
 
             # Forward-backward pass
             fwdbwd_future = training_client.forward_backward(data, "cross_entropy")
             optim_future = training_client.optim_step(types.AdamParams(learning_rate=learning_rate))
 
+            # Sample step N+1 from the pre-update checkpoint while gradients run;
+            # one step off-policy, the same weights this GRPO batch was drawn from
+            if step + 1 < num_steps:
+                pending_batch = request_batch(sampling_client)
+
             fwdbwd_result = fwdbwd_future.result()
-            optim_result = optim_future.result()
+            optim_future.result()
+
+            # Compute loss without round-tripping arrays through Python lists
+            logprobs = np.concatenate(
+                [np.asarray(out["logprobs"]) for out in fwdbwd_result.loss_fn_outputs]
+            )
+            weights = np.concatenate(
+                [np.asarray(d.loss_fn_inputs["weights"]) for d in data]
+            )
+            denom = max(float(weights.sum()), 1e-8)
+            loss = -float(np.dot(logprobs, weights)) / denom
 
-            # Compute loss
-            logprobs = np.concatenate([out["logprobs"].tolist() for out in fwdbwd_result.loss_fn_outputs])
-            weights = np.concatenate([d.loss_fn_inputs["weights"].tolist() for d in data])
-            loss = -np.dot(logprobs, weights) / max(sum(weights), 1e-8)
+            # Only the scalar loss survives; drop the per-token arrays now so
+            # their memory is back before the next sampling phase allocates
+            del fwdbwd_result, logprobs, weights, data
         else:
             loss = 0.0
+            if step + 1 < num_steps:
+                pending_batch = request_batch(sampling_client)
+
+        # Refresh the sampling checkpoint for the batch after the one in flight
+        if step + 1 < num_steps:
+            sampling_client = training_client.save_weights_and_get_sampling_client(
+                name=f"step_{step + 1}"
+            )
 
-        # Compute batch metrics
-        mean_reward = np.mean(all_rewards)
-        mean_correct = np.mean(all_correct)
-        mean_format = np.mean(all_format)
+        # Compute batch metrics as single reductions over packed buffers
+        mean_reward = float(rewards.mean())
+        mean_correct = float(all_correct.mean())
+        mean_format = float(all_format.mean())
 
-        # Log to tviz
-        logger.log_metrics({
+        # Log to tviz off the hot path
+        log_executor.submit(logger.log_metrics, {
             "loss": loss,
             "reward_mean": mean_reward,
             "env/all/correct": mean_correct,
@@ -223,6 +232,7 @@ def main():
 
         print(f"Step {step}: loss={loss:.4f}, reward={mean_reward:.3f}, correct={mean_correct:.3f}")
 
+    log_executor.shutdown(wait=True)
     logger.close()
     print(f"\nTraining complete! View at: {logger.get_logger_url()}")
 
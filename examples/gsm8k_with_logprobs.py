@@ -9,61 +9,15 @@ Usage:
     python examples/gsm8k_with_logprobs.py
 """
 
-import re
 import numpy as np
 import tinker
 from tinker import types
 from datasets import load_dataset
 from transformers import AutoTokenizer
 
-from tviz import TvizLogger
-
-
-def extract_boxed(text: str) -> str:
-    """Extract answer from \\boxed{...} format."""
-    match = re.search(r"\\boxed\{([^}]+)\}", text)
-    if match:
-        return match.group(1).strip()
-    raise ValueError("No boxed answer found")
-
-
-def check_format(response: str) -> bool:
-    """Check if response has \\boxed{} format."""
-    try:
-        extract_boxed(response)
-        return True
-    except ValueError:
-        return False
-
+from _gsm8k_utils import compute_reward, parse_gold_answer
 
-def check_correct(response: str, answer: str) -> bool:
-    """Check if extracted answer matches ground truth."""
-    try:
-        pred = extract_boxed(response)
-        pred_clean = pred.replace(",", "").strip()
-        ans_clean = answer.replace(",", "").strip()
-        try:
-            return abs(float(pred_clean) - float(ans_clean)) < 1e-6
-        except ValueError:
-            return pred_clean.lower() == ans_clean.lower()
-    except ValueError:
-        return False
-
-
-def compute_reward(response: str, answer: str) -> tuple[float, dict]:
-    """Compute reward: 1[correct] + 0.1 * (1[formatted] - 1)"""
-    is_formatted = check_format(response)
-    is_correct = check_correct(response, answer) if is_formatted else False
-    reward = float(is_correct) + 0.1 * (float(is_formatted) - 1)
-    return reward, {"format": float(is_formatted), "correct": float(is_correct)}
-
-
-def extract_gsm8k_answer(answer_text: str) -> str:
-    """Extract numeric answer from GSM8K answer field."""
-    match = re.search(r"####\s*([\d,]+)", answer_text)
-    if match:
-        return match.group(1).replace(",", "")
-    return answer_text.strip()
+from tviz import TvizLogger
 
 
 def main():
@@ -74,6 +28,9 @@ def main():
     num_steps = 5
     max_tokens = 256
 
+    # Persistent RNG (cheaper than the legacy np.random.* dispatch per call)
+    rng = np.random.default_rng()
+
     # Setup tviz
     logger = TvizLogger(run_name="gsm8k_logprobs_demo", modality="text")
     logger.log_hparams({
@@ -93,8 +50,12 @@ def main():
     tokenizer = AutoTokenizer.from_pretrained(model_name)
 
     # Load GSM8K
+    # Keep the Arrow-backed dataset; random access is O(1) without materializing dicts
     dataset = load_dataset("gsm8k", "main", split="train")
-    problems = list(dataset)
+    problems = dataset
+
+    # Parse every gold answer once so reward checks are a float compare
+    gold_answers = [parse_gold_answer(answer) for answer in dataset["answer"]]
 
     # Few-shot prefix
     fewshot_prefix = (
@@ -103,6 +64,16 @@ def main():
         "The letter 'r' appears at positions 3, 8, and 9. \\boxed{3}\n\n"
     )
 
+    # Prompt encodings are immutable per problem - tokenize each at most once
+    prompt_token_cache: list = [None] * len(problems)
+
+    # Sampling parameters never change; build them once, not per prompt
+    sampling_params = types.SamplingParams(
+        max_tokens=max_tokens,
+        temperature=0.7,
+        stop=["\n\nUser:", "\n\n\n"],
+    )
+
     # Training loop
     for step in range(num_steps):
         print(f"\n=== Step {step} ===")
@@ -113,34 +84,49 @@ def main():
         )
 
         # Sample batch of problems
-        batch_indices = np.random.choice(len(problems), batch_size, replace=False)
-        batch = [problems[i] for i in batch_indices]
+        batch_indices = rng.choice(len(problems), batch_size, replace=False)
 
-        all_rewards = []
-        all_correct = []
+        # Preallocated packed metric buffers, one slot per trajectory
+        all_rewards = np.empty(batch_size * group_size, np.float32)
+        all_correct = np.empty(batch_size * group_size, np.float32)
         rollouts = []
-
-        for group_idx, problem in enumerate(batch):
-            question = problem["question"] + " Write your answer in \\boxed{} format."
-            answer = extract_gsm8k_answer(problem["answer"])
-
-            # Build prompt
-            prompt_text = fewshot_prefix + f"User: {question}\n\nAssistant:"
-            prompt_tokens = tokenizer.encode(prompt_text)
+        ti = 0
+
+        # Batch-tokenize only problems we have not seen before
+        answers = [gold_answers[i] for i in batch_indices]
+        prompt_texts = [
+            fewshot_prefix
+            + f"User: {problems[int(i)]['question']} Write your answer in \\boxed{{}} format.\n\nAssistant:"
+            for i in batch_indices
+        ]
+        new_pairs = [
+            (i, text)
+            for i, text in zip(batch_indices, prompt_texts)
+            if prompt_token_cache[i] is None
+        ]
+        if new_pairs:
+            new_encodings = tokenizer([text for _, text in new_pairs])["input_ids"]
+            for (i, _), tokens in zip(new_pairs, new_encodings):
+                prompt_token_cache[i] = tokens
+        batch_prompt_tokens = [prompt_token_cache[i] for i in batch_indices]
+
+        # Issue all sampling requests up front so groups sample concurrently
+        sample_futures = []
+        for prompt_tokens in batch_prompt_tokens:
             prompt = types.ModelInput.from_ints(prompt_tokens)
-
-            # Sample multiple completions with logprobs
-            params = types.SamplingParams(
-                max_tokens=max_tokens,
-                temperature=0.7,
-                stop=["\n\nUser:", "\n\n\n"],
+            sample_futures.append(
+                sampling_client.sample(
+                    prompt=prompt,
+                    sampling_params=sampling_params,
+                    num_samples=group_size,
+                    include_logprobs=True,  # Request logprobs!
+                )
             )
-            result = sampling_client.sample(
-                prompt=prompt,
-                sampling_params=params,
-                num_samples=group_size,
-                include_logprobs=True,  # Request logprobs!
-            ).result()
+
+        for group_idx, (answer, prompt_text, future) in enumerate(
+            zip(answers, prompt_texts, sample_futures)
+        ):
+            result = future.result()
 
             # Build trajectories for this rollout group
             trajectories = []
@@ -150,15 +136,19 @@ def main():
                 response = tokenizer.decode(seq.tokens)
                 reward, metrics = compute_reward(response, answer)
                 group_rewards.append(reward)
-                all_rewards.append(reward)
-                all_correct.append(metrics["correct"])
-
-                # Extract logprobs from sequence
-                logprobs = None
-                if hasattr(seq, 'logprobs') and seq.logprobs is not None:
-                    logprobs = list(seq.logprobs)
-                elif hasattr(seq, 'token_logprobs') and seq.token_logprobs is not None:
-                    logprobs = list(seq.token_logprobs)
+                all_rewards[ti] = reward
+                all_correct[ti] = metrics["correct"]
+                ti += 1
+
+                # Extract logprobs as a packed array; the logger converts when serializing
+                raw_logprobs = getattr(seq, "logprobs", None)
+                if raw_logprobs is None:
+                    raw_logprobs = getattr(seq, "token_logprobs", None)
+                logprobs = (
+                    np.asarray(raw_logprobs, dtype=np.float32)
+                    if raw_logprobs is not None
+                    else None
+                )
 
                 trajectories.append({
                     "trajectory_idx": traj_idx,
@@ -181,9 +171,9 @@ def main():
         # Log rollouts with logprobs
         logger.log_rollouts(rollouts, step=step)
 
-        # Log metrics
-        mean_reward = np.mean(all_rewards)
-        mean_correct = np.mean(all_correct)
+        # Log metrics as single reductions over packed buffers
+        mean_reward = float(all_rewards.mean())
+        mean_correct = float(all_correct.mean())
 
         logger.log_metrics({
             "reward_mean": mean_reward,
@@ -194,7 +184,7 @@ def main():
 
         # Check if we got logprobs
         sample_traj = rollouts[0]["trajectories"][0]
-        if sample_traj.get("logprobs"):
+        if sample_traj.get("logprobs") is not None and len(sample_traj["logprobs"]):
             print(f"  Logprobs: {len(sample_traj['logprobs'])} tokens")
         else:
             print("  No logprobs captured")
@@ -10,13 +10,14 @@ Usage:
     python examples/rl_loop.py
 """
 
-import re
 import numpy as np
 import tinker
 from tinker import types
 from datasets import load_dataset
 from transformers import AutoTokenizer
 
+from _gsm8k_utils import get_reward, parse_gold_answer
+
 from tviz import TvizLogger
 
 
@@ -30,37 +31,10 @@ MAX_TOKENS = 256
 LORA_RANK = 32
 
 
-def extract_boxed(text: str) -> str:
-    """Extract answer from \\boxed{...} format."""
-    match = re.search(r"\\boxed\{([^}]+)\}", text)
-    if match:
-        return match.group(1).strip()
-    raise ValueError("No boxed answer found")
-
-
-def get_reward(response: str, answer: str) -> float:
-    """Compute reward: 1.0 if correct, 0.0 otherwise."""
-    try:
-        pred = extract_boxed(response)
-        pred_clean = pred.replace(",", "").strip()
-        ans_clean = answer.replace(",", "").strip()
-        try:
-            return 1.0 if abs(float(pred_clean) - float(ans_clean)) < 1e-6 else 0.0
-        except ValueError:
-            return 1.0 if pred_clean.lower() == ans_clean.lower() else 0.0
-    except ValueError:
-        return 0.0
-
-
-def extract_gsm8k_answer(answer_text: str) -> str:
-    """Extract numeric answer from GSM8K answer field."""
-    match = re.search(r"####\s*([\d,]+)", answer_text)
-    if match:
-        return match.group(1).replace(",", "")
-    return answer_text.strip()
-
-
 def main():
+    # Persistent RNG (cheaper than the legacy np.random.* dispatch per call)
+    rng = np.random.default_rng()
+
     # Setup tviz
     logger = TvizLogger(run_name="rl_loop")
     logger.log_hparams({
@@ -82,8 +56,22 @@ def main():
     tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
 
     # Load GSM8K
+    # Keep the Arrow-backed dataset; random access is O(1) without materializing dicts
     dataset = load_dataset("gsm8k", "main", split="train")
-    problems = list(dataset)
+    problems = dataset
+
+    # Parse every gold answer once so reward checks are a float compare
+    gold_answers = [parse_gold_answer(answer) for answer in dataset["answer"]]
+
+    # Prompt encodings are immutable per problem - tokenize each at most once
+    prompt_token_cache: list = [None] * len(problems)
+
+    # Sampling parameters never change; build them once, not per prompt
+    sampling_params = types.SamplingParams(
+        max_tokens=MAX_TOKENS,
+        temperature=0.7,
+        stop=["\n\nUser:", "\n\n\n"],
+    )
 
     # Training loop
     for step in range(NUM_STEPS):
@@ -91,86 +79,97 @@ def main():
         sampling_client = training_client.save_weights_and_get_sampling_client(name=f"step_{step}")
 
         # Sample batch of problems
-        batch_indices = np.random.choice(len(problems), BATCH_SIZE, replace=False)
-        batch = [problems[i] for i in batch_indices]
-
-        all_rewards = []
-        training_data = []
-
-        for problem in batch:
-            question = problem["question"] + " Write your answer in \\boxed{} format."
-            answer = extract_gsm8k_answer(problem["answer"])
+        batch_indices = rng.choice(len(problems), BATCH_SIZE, replace=False)
+
+        # SoA layout: parallel per-trajectory lists, rewards in a preallocated buffer
+        rewards = np.empty(BATCH_SIZE * GROUP_SIZE, np.float32)
+        tokens_list = []
+        prompt_lens = []
+        ti = 0
+
+        # Batch-tokenize only problems we have not seen before
+        answers = [gold_answers[i] for i in batch_indices]
+        new_indices = [i for i in batch_indices if prompt_token_cache[i] is None]
+        if new_indices:
+            new_texts = [
+                f"User: {problems[int(i)]['question']} Write your answer in \\boxed{{}} format.\n\nAssistant:"
+                for i in new_indices
+            ]
+            for i, tokens in zip(new_indices, tokenizer(new_texts)["input_ids"]):
+                prompt_token_cache[i] = tokens
+        batch_prompt_tokens = [prompt_token_cache[i] for i in batch_indices]
 
-            # Build prompt
-            prompt_text = f"User: {question}\n\nAssistant:"
-            prompt_tokens = tokenizer.encode(prompt_text)
+        # Issue all sampling requests up front so groups sample concurrently
+        sample_futures = []
+        for prompt_tokens in batch_prompt_tokens:
             prompt = types.ModelInput.from_ints(prompt_tokens)
-
-            # Sample multiple completions (group)
-            params = types.SamplingParams(
-                max_tokens=MAX_TOKENS,
-                temperature=0.7,
-                stop=["\n\nUser:", "\n\n\n"],
+            sample_futures.append(
+                sampling_client.sample(
+                    prompt=prompt,
+                    sampling_params=sampling_params,
+                    num_samples=GROUP_SIZE,
+                )
             )
-            result = sampling_client.sample(
-                prompt=prompt,
-                sampling_params=params,
-                num_samples=GROUP_SIZE,
-            ).result()
+
+        for answer, prompt_tokens, future in zip(answers, batch_prompt_tokens, sample_futures):
+            result = future.result()
 
             # Compute rewards
-            group_rewards = []
             for seq in result.sequences:
                 response = tokenizer.decode(seq.tokens)
-                reward = get_reward(response, answer)
-                group_rewards.append(reward)
-                all_rewards.append(reward)
+                rewards[ti] = get_reward(response, answer)
+                ti += 1
 
                 # Build training datum
-                full_tokens = prompt_tokens + list(seq.tokens)
-                weights = [0] * len(prompt_tokens) + [1] * len(seq.tokens)
-
-                training_data.append({
-                    "tokens": full_tokens,
-                    "weights": weights,
-                    "reward": reward,
-                })
-
-            # Compute advantages (GRPO: reward - mean)
-            mean_reward = np.mean(group_rewards)
-            for td in training_data[-GROUP_SIZE:]:
-                td["advantage"] = td["reward"] - mean_reward
-
-        # Filter to positive advantages only
-        positive_data = [td for td in training_data if td["advantage"] > 0]
-
-        if positive_data:
+                tokens_list.append(prompt_tokens + list(seq.tokens))
+                prompt_lens.append(len(prompt_tokens))
+
+        # Compute advantages for the whole batch at once (GRPO: reward - group mean)
+        advantages = rewards.reshape(-1, GROUP_SIZE)
+        advantages = (advantages - advantages.mean(axis=1, keepdims=True)).ravel()
+
+        # All-equal groups (common early in training) yield no positive
+        # advantages; skip the forward/backward round-trip entirely
+        if advantages.max() > 0:
+            # Filter to positive advantages only
+            pos_indices = np.flatnonzero(advantages > 0)
             # Build Datum objects
-            data = [
-                types.Datum(
-                    model_input=types.ModelInput.from_ints(tokens=td["tokens"][:-1]),
-                    loss_fn_inputs=dict(
-                        weights=[w * td["advantage"] for w in td["weights"][1:]],
-                        target_tokens=td["tokens"][1:],
-                    ),
+            data = []
+            for i in pos_indices:
+                tokens = tokens_list[i]
+                # 0/1 mask times advantage is just advantage on completion positions
+                weights = np.zeros(len(tokens) - 1, np.float32)
+                weights[prompt_lens[i] - 1 :] = advantages[i]
+                data.append(
+                    types.Datum(
+                        model_input=types.ModelInput.from_ints(tokens=tokens[:-1]),
+                        loss_fn_inputs=dict(
+                            weights=weights.tolist(),
+                            target_tokens=tokens[1:],
+                        ),
+                    )
                 )
-                for td in positive_data
-            ]
 
             # Forward-backward pass
             fwdbwd_result = training_client.forward_backward(data, "cross_entropy").result()
             training_client.optim_step(types.AdamParams(learning_rate=LEARNING_RATE)).result()
 
             # Compute loss
-            logprobs = np.concatenate([out["logprobs"].tolist() for out in fwdbwd_result.loss_fn_outputs])
-            weights = np.concatenate([d.loss_fn_inputs["weights"].tolist() for d in data])
-            loss = -np.dot(logprobs, weights) / max(sum(weights), 1e-8)
+            logprobs = np.concatenate(
+                [np.asarray(out["logprobs"]) for out in fwdbwd_result.loss_fn_outputs]
+            )
+            weights = np.concatenate([np.asarray(d.loss_fn_inputs["weights"]) for d in data])
+            denom = max(float(weights.sum()), 1e-8)
+            loss = -float(np.dot(logprobs, weights)) / denom
+
+            # Only the scalar loss survives; free the per-token arrays now
+            del fwdbwd_result, logprobs, weights, data
         else:
             loss = 0.0
 
-        # Compute metrics
-        mean_reward = np.mean(all_rewards)
-        accuracy = np.mean([1.0 if r > 0 else 0.0 for r in all_rewards])
+        # Compute metrics as single reductions over the packed reward buffer
+        mean_reward = float(rewards.mean())
+        accuracy = float((rewards > 0).mean())
 
         # Log to tviz
         logger.log_metrics({
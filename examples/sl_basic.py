@@ -18,6 +18,9 @@ from tviz import TvizLogger
 
 
 def main():
+    # Persistent RNG (cheaper than the legacy np.random.* dispatch per call)
+    rng = np.random.default_rng()
+
     # Config
     model_name = "meta-llama/Llama-3.1-8B"
     batch_size = 4
@@ -59,30 +62,32 @@ def main():
         {"instruction": "What is the largest planet?", "response": "Jupiter is the largest planet in our solar system."},
     ]
 
+    # The example set is fixed, so tokenize every prompt/completion pair once
+    # up front; steps then sample from the cache with no tokenizer calls at all.
+    # Prompt and completion halves are encoded separately and concatenated so
+    # the weight boundary is exact by construction.
+    prompts = [f"User: {example['instruction']}\n\nAssistant:" for example in examples]
+    completions = [f" {example['response']}" for example in examples]
+    encodings = tokenizer(prompts + completions, add_special_tokens=False)["input_ids"]
+
+    tokenized = []
+    for prompt_tokens, completion_tokens in zip(
+        encodings[: len(examples)], encodings[len(examples):]
+    ):
+        # Weights: 0 for prompt, 1 for completion, packed float32 from the start
+        weights = np.zeros(len(prompt_tokens) + len(completion_tokens), dtype=np.float32)
+        weights[len(prompt_tokens):] = 1.0
+
+        tokenized.append({
+            "tokens": prompt_tokens + completion_tokens,
+            "weights": weights,
+        })
+
     # Training loop
     for step in range(num_steps):
-        # Sample a batch
-        batch_indices = np.random.choice(len(examples), batch_size, replace=True)
-        batch = [examples[i] for i in batch_indices]
-
-        training_data = []
-        for example in batch:
-            # Format as chat
-            prompt = f"User: {example['instruction']}\n\nAssistant:"
-            completion = f" {example['response']}"
-            full_text = prompt + completion
-
-            # Tokenize
-            prompt_tokens = tokenizer.encode(prompt, add_special_tokens=False)
-            full_tokens = tokenizer.encode(full_text, add_special_tokens=False)
-
-            # Weights: 0 for prompt, 1 for completion
-            weights = [0] * len(prompt_tokens) + [1] * (len(full_tokens) - len(prompt_tokens))
-
-            training_data.append({
-                "tokens": full_tokens,
-                "weights": weights,
-            })
+        # Sample a batch of pre-tokenized examples
+        batch_indices = rng.integers(0, len(examples), batch_size)
+        training_data = [tokenized[i] for i in batch_indices]
 
         # Build Datum objects
         data = [
@@ -100,10 +105,12 @@ def main():
         fwdbwd_result = training_client.forward_backward(data, "cross_entropy").result()
         training_client.optim_step(types.AdamParams(learning_rate=learning_rate)).result()
 
-        # Compute loss
-        logprobs = np.concatenate([out["logprobs"].tolist() for out in fwdbwd_result.loss_fn_outputs])
-        weights = np.concatenate([d.loss_fn_inputs["weights"].tolist() for d in data])
-        loss = -np.dot(logprobs, weights) / max(sum(weights), 1e-8)
+        # Compute loss without round-tripping arrays through Python lists
+        logprobs = np.concatenate(
+            [np.asarray(out["logprobs"]) for out in fwdbwd_result.loss_fn_outputs]
+        )
+        weights = np.concatenate([np.asarray(d.loss_fn_inputs["weights"]) for d in data])
+        loss = -float(np.dot(logprobs, weights)) / max(float(weights.sum()), 1e-8)
 
         # Log to tviz
         logger.log_metrics({
@@ -10,6 +10,8 @@ Usage:
     python examples/sl_loop.py
 """
 
+from concurrent.futures import ThreadPoolExecutor
+
 import numpy as np
 import tinker
 from tinker import types
@@ -27,8 +29,45 @@ LEARNING_RATE = 1e-4
 MAX_LENGTH = 2048
 LORA_RANK = 32
 
+# Zero weight for the EOS separator between packed examples
+_EOS_WEIGHT = np.zeros(1, dtype=np.float32)
+
+
+def pack_examples(training_data, seq_len, eos):
+    """Greedily pack token/weight sequences into windows of at most seq_len.
+
+    Sequences are joined with an EOS separator (weight 0) so one Datum carries
+    several short examples back to back; a sequence that does not fit starts a
+    new window. With short conversations this keeps every sequence slot nearly
+    full instead of mostly padding.
+    """
+    windows = []
+    cur_tokens: list = []
+    cur_weight_parts: list = []
+
+    def _close_window():
+        windows.append({"tokens": cur_tokens, "weights": np.concatenate(cur_weight_parts)})
+
+    for td in training_data:
+        needed = len(td["tokens"]) + (1 if cur_tokens else 0)
+        if cur_tokens and len(cur_tokens) + needed > seq_len:
+            _close_window()
+            cur_tokens, cur_weight_parts = [], []
+        if cur_tokens:
+            cur_tokens.append(eos)
+            cur_weight_parts.append(_EOS_WEIGHT)
+        cur_tokens += td["tokens"]
+        cur_weight_parts.append(td["weights"])
+
+    if cur_tokens:
+        _close_window()
+    return windows
+
 
 def main():
+    # Persistent RNG (cheaper than the legacy np.random.* dispatch per call)
+    rng = np.random.default_rng()
+
     # Setup tviz
     logger = TvizLogger(run_name="sl_loop")
     logger.log_hparams({
@@ -56,49 +95,58 @@ def main():
     examples = list(dataset)
     print(f"Loaded {len(examples)} examples")
 
-    # Training loop
-    for step in range(NUM_STEPS):
-        # Sample batch
-        batch_indices = np.random.choice(len(examples), BATCH_SIZE, replace=False)
-        batch = [examples[i] for i in batch_indices]
+    # Pre-tokenize the whole dataset in one batched call so the training loop
+    # never touches the tokenizer; sampling then just indexes ready-made
+    # (prompt_tokens, completion_tokens) pairs
+    print("Tokenizing dataset...")
+    prompt_texts = []
+    completion_texts = []
+    for example in examples:
+        messages = example["messages"]
+
+        # Build prompt from all but last assistant message
+        prompt_parts = []
+        completion = ""
+
+        for msg in messages:
+            role = msg["role"]
+            content = msg["content"]
+
+            if role == "user":
+                prompt_parts.append(f"User: {content}")
+            elif role == "assistant":
+                completion = f"Assistant: {content}"
+
+        prompt_texts.append("\n\n".join(prompt_parts) + "\n\n")
+        completion_texts.append(completion)
+
+    # Prompt and completion halves are encoded once each and concatenated,
+    # instead of re-encoding the prompt inside the full text a second time
+    encodings = tokenizer(prompt_texts + completion_texts, add_special_tokens=False)["input_ids"]
+    tokenized = list(zip(encodings[: len(examples)], encodings[len(examples):]))
+
+    def prepare_batch():
+        """Sample a batch and build its packed Datum list plus token count."""
+        # shuffle=False skips the full Fisher-Yates pass the legacy API does
+        batch_indices = rng.choice(len(examples), BATCH_SIZE, replace=False, shuffle=False)
 
         training_data = []
         total_tokens = 0
 
-        for example in batch:
-            # Format conversation as prompt + completion
-            messages = example["messages"]
-
-            # Build prompt from all but last assistant message
-            prompt_parts = []
-            completion = ""
-
-            for msg in messages:
-                role = msg["role"]
-                content = msg["content"]
-
-                if role == "user":
-                    prompt_parts.append(f"User: {content}")
-                elif role == "assistant":
-                    completion = f"Assistant: {content}"
-
-            prompt_text = "\n\n".join(prompt_parts) + "\n\n"
-            full_text = prompt_text + completion
-
-            # Tokenize
-            prompt_tokens = tokenizer.encode(prompt_text, add_special_tokens=False)
-            full_tokens = tokenizer.encode(full_text, add_special_tokens=False)
+        for i in batch_indices:
+            prompt_tokens, completion_tokens = tokenized[i]
+            full_tokens = prompt_tokens + completion_tokens
+            prompt_len = len(prompt_tokens)
 
             # Truncate if needed
             if len(full_tokens) > MAX_LENGTH:
                 full_tokens = full_tokens[:MAX_LENGTH]
-                # Adjust prompt tokens if needed
-                if len(prompt_tokens) > len(full_tokens):
-                    prompt_tokens = prompt_tokens[:len(full_tokens)]
+                prompt_len = min(prompt_len, MAX_LENGTH)
 
-            # Weights: 0 for prompt, 1 for completion (train on assistant only)
-            num_completion_tokens = len(full_tokens) - len(prompt_tokens)
-            weights = [0.0] * len(prompt_tokens) + [1.0] * num_completion_tokens
+            # Weights: 0 for prompt, 1 for completion (train on assistant only),
+            # packed float32 from the start so packing and the loss skip lists
+            weights = np.zeros(len(full_tokens), dtype=np.float32)
+            weights[prompt_len:] = 1.0
 
             total_tokens += len(full_tokens)
 
@@ -107,6 +155,11 @@ def main():
                 "weights": weights,
             })
 
+        # Pack longest-first (first-fit decreasing) into MAX_LENGTH windows so
+        # each submitted sequence is nearly full rather than one short example
+        training_data.sort(key=lambda td: len(td["tokens"]), reverse=True)
+        packed = pack_examples(training_data, MAX_LENGTH, tokenizer.eos_token_id)
+
         # Build Datum objects
         data = [
             types.Datum(
@@ -116,24 +169,39 @@ def main():
                     target_tokens=td["tokens"][1:],
                 ),
             )
-            for td in training_data
+            for td in packed
         ]
+        return data, total_tokens
+
+    # Prepare batches one step ahead on a worker thread so CPU-side data prep
+    # overlaps the remote forward/backward instead of serializing with it
+    prep_executor = ThreadPoolExecutor(max_workers=1)
+    next_batch = prep_executor.submit(prepare_batch)
+
+    # Training loop
+    for step in range(NUM_STEPS):
+        data, total_tokens = next_batch.result()
 
         # Forward-backward pass
-        fwdbwd_result = training_client.forward_backward(data, "cross_entropy").result()
+        fwdbwd_future = training_client.forward_backward(data, "cross_entropy")
+
+        # Kick off step N+1's prep while the server runs step N
+        if step + 1 < NUM_STEPS:
+            next_batch = prep_executor.submit(prepare_batch)
+
+        fwdbwd_result = fwdbwd_future.result()
         training_client.optim_step(types.AdamParams(learning_rate=LEARNING_RATE)).result()
 
-        # Compute loss (negative log likelihood)
-        all_logprobs = []
-        all_weights = []
-        for i, out in enumerate(fwdbwd_result.loss_fn_outputs):
-            all_logprobs.extend(out["logprobs"].tolist())
-            all_weights.extend(data[i].loss_fn_inputs["weights"].tolist())
+        # Compute loss (negative log likelihood) as one vectorized reduction
+        logprobs = np.concatenate(
+            [np.asarray(out["logprobs"]) for out in fwdbwd_result.loss_fn_outputs]
+        )
+        weights = np.concatenate(
+            [np.asarray(d.loss_fn_inputs["weights"], dtype=np.float32) for d in data]
+        )
 
         # Mean NLL over weighted tokens
-        weighted_sum = sum(lp * w for lp, w in zip(all_logprobs, all_weights))
-        weight_sum = sum(all_weights)
-        mean_nll = -weighted_sum / max(weight_sum, 1e-8)
+        mean_nll = -float(np.dot(logprobs, weights)) / max(float(weights.sum()), 1e-8)
 
         # Log to tviz
         logger.log_metrics({
@@ -144,6 +212,7 @@ def main():
 
         print(f"Step {step}: loss={mean_nll:.4f}, tokens={total_tokens}")
 
+    prep_executor.shutdown(wait=True)
     logger.close()
     print(f"\nTraining complete! View at: {logger.get_logger_url()}")
 
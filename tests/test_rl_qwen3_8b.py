@@ -20,8 +20,11 @@ Requires TINKER_API_KEY environment variable.
 import asyncio
 import os
 import sys
+from array import array
 from pathlib import Path
 
+import numpy as np
+
 # Add master-tinker to path
 sys.path.insert(0, "/Users/sdan/Developer/master-tinker")
 
@@ -48,6 +51,7 @@ async def test_rl_qwen3_8b():
     group_size = int(os.environ.get("TVIZ_GROUP_SIZE", "16"))  # G=16 trajectories per problem
     max_tokens = int(os.environ.get("TVIZ_MAX_TOKENS", "768"))  # longer responses
     num_steps = int(os.environ.get("TVIZ_NUM_STEPS", "10"))  # 10 steps
+    max_in_flight = int(os.environ.get("TVIZ_MAX_IN_FLIGHT", "32"))  # concurrent samples
 
     # Initialize tviz logger (uses TVIZ_DB_PATH or default ~/.tviz/tviz.db)
     logger = TvizLogger(run_name="gsm8k_qwen3_8b", modality="text")
@@ -98,8 +102,10 @@ async def test_rl_qwen3_8b():
     print(f"  Total expected: {total_expected} trajectories")
     print(f"  Max tokens per trajectory: {max_tokens}")
 
-    all_rewards: list[float] = []
-    all_token_counts: list[int] = []
+    # Unboxed running history: 4 bytes per value instead of a PyFloat each,
+    # and np.frombuffer gives zero-copy views for the summary reductions
+    all_rewards = array("f")
+    all_token_counts = array("i")
     correct_count = 0
     total_count = 0
 
@@ -109,16 +115,18 @@ async def test_rl_qwen3_8b():
         print(f"Step {step + 1}/{steps_to_run}: {len(env_group_builders)} environment groups")
         print(f"{'='*60}")
 
-        # Run rollouts
-        trajectory_groups: list[TrajectoryGroup] = []
+        # Run all groups concurrently with a bound on total in-flight sampling
+        # requests, so reward computation for a finished group overlaps rollouts
+        # still sampling in the others and the tail of one group can't idle us
+        sem = asyncio.Semaphore(max_in_flight)
 
-        for i, env_group_builder in enumerate(env_group_builders):
-            print(f"\n  Group {i + 1}/{len(env_group_builders)}: Running {group_size} trajectories...")
+        async def _bounded_rollout(env):
+            async with sem:
+                return await _do_rollout(env, completer)
 
+        async def _run_group(group_num: int, env_group_builder) -> TrajectoryGroup:
             envs = await env_group_builder.make_envs()
-            trajectories = await asyncio.gather(*[
-                _do_rollout(env, completer) for env in envs
-            ])
+            trajectories = await asyncio.gather(*[_bounded_rollout(env) for env in envs])
 
             rewards_and_metrics = await env_group_builder.compute_group_rewards(trajectories, envs)
             final_rewards = [r for r, _ in rewards_and_metrics]
@@ -129,55 +137,69 @@ async def test_rl_qwen3_8b():
                 final_rewards_G=final_rewards,
                 metrics_G=metrics,
             )
-            trajectory_groups.append(traj_group)
 
             total_rewards = traj_group.get_total_rewards()
             all_rewards.extend(total_rewards)
 
-            # Show reward distribution for this group
-            sorted_rewards = sorted(total_rewards, reverse=True)
-            print(f"    Rewards: {[f'{r:.2f}' for r in sorted_rewards]}")
-            print(f"    Best: {max(total_rewards):.2f}, Mean: {sum(total_rewards)/len(total_rewards):.2f}, Worst: {min(total_rewards):.2f}")
+            # Summarize with one vectorized pass; the full sorted listing is
+            # only worth computing when verbose output is requested
+            arr = np.asarray(total_rewards, dtype=np.float32)
+            if os.environ.get("TVIZ_VERBOSE"):
+                print(f"    Rewards: {[f'{r:.2f}' for r in sorted(total_rewards, reverse=True)]}")
+            print(f"  Group {group_num}/{len(env_group_builders)}: "
+                  f"Best: {arr.max():.2f}, Mean: {arr.mean():.2f}, Worst: {arr.min():.2f}")
+            return traj_group
+
+        trajectory_groups: list[TrajectoryGroup] = list(
+            await asyncio.gather(*[
+                _run_group(i + 1, builder) for i, builder in enumerate(env_group_builders)
+            ])
+        )
 
         # Convert and log to tviz
         print(f"\n  Converting {len(trajectory_groups)} groups to tviz format...")
         rollouts = from_tinker_batch(trajectory_groups, tokenizer=tokenizer)
 
-        step_rewards = [r for tg in trajectory_groups for r in tg.get_total_rewards()]
-
-        # Count tokens and correctness
-        step_token_counts = []
-        step_correct = 0
+        # One pass over the groups fills packed reward/token buffers; every
+        # step statistic below is then a single vectorized reduction
+        num_trajs = sum(len(tg.trajectories_G) for tg in trajectory_groups)
+        step_rewards = np.empty(num_trajs, np.float32)
+        step_token_counts = np.empty(num_trajs, np.int32)
+        ti = 0
         for tg in trajectory_groups:
-            for traj in tg.trajectories_G:
-                token_count = sum(len(t.ac.tokens) for t in traj.transitions)
-                step_token_counts.append(token_count)
-            for r in tg.get_total_rewards():
-                if r > 0.5:  # Correct answer threshold
-                    step_correct += 1
-
-        all_token_counts.extend(step_token_counts)
+            for traj, r in zip(tg.trajectories_G, tg.get_total_rewards()):
+                step_token_counts[ti] = sum(len(t.ac.tokens) for t in traj.transitions)
+                step_rewards[ti] = r
+                ti += 1
+
+        step_correct = int((step_rewards > 0.5).sum())  # Correct answer threshold
+
+        all_token_counts.extend(step_token_counts.tolist())
         correct_count += step_correct
-        total_count += len(step_rewards)
+        total_count += num_trajs
 
         metrics = {
             # Reward statistics
-            "reward_mean": sum(step_rewards) / len(step_rewards),
-            "reward_max": max(step_rewards),
-            "reward_min": min(step_rewards),
+            "reward_mean": float(step_rewards.mean()),
+            "reward_max": float(step_rewards.max()),
+            "reward_min": float(step_rewards.min()),
             "reward_std": _std(step_rewards),
             # Token statistics
-            "tokens_mean": sum(step_token_counts) / len(step_token_counts),
-            "tokens_max": max(step_token_counts),
-            "tokens_min": min(step_token_counts),
+            "tokens_mean": float(step_token_counts.mean()),
+            "tokens_max": int(step_token_counts.max()),
+            "tokens_min": int(step_token_counts.min()),
             # Accuracy tracking
-            "step_accuracy": step_correct / len(step_rewards),
+            "step_accuracy": step_correct / num_trajs,
             "cumulative_accuracy": correct_count / total_count,
             # Counts
-            "num_trajectories": len(step_rewards),
+            "num_trajectories": num_trajs,
             "cumulative_trajectories": len(all_rewards),
             # Running averages
-            "running_reward_mean": sum(all_rewards) / len(all_rewards) if all_rewards else 0.0,
+            "running_reward_mean": (
+                float(np.frombuffer(all_rewards, dtype=np.float32).mean())
+                if len(all_rewards)
+                else 0.0
+            ),
         }
         logger.log_metrics(metrics, step=step)
         logger.log_rollouts(rollouts, step=step)
@@ -191,17 +213,21 @@ async def test_rl_qwen3_8b():
     print(f"\n{'='*60}")
     print("Run Complete")
     print(f"{'='*60}")
-    print(f"✓ Logged {len(all_rewards)} total trajectories across {steps_to_run} steps")
-    print(f"  Overall mean reward: {sum(all_rewards)/len(all_rewards):.3f}")
-    print(f"  Overall max reward: {max(all_rewards):.3f}")
-    print(f"  Overall min reward: {min(all_rewards):.3f}")
+    rewards_arr = np.frombuffer(all_rewards, dtype=np.float32)
+    tokens_arr = np.frombuffer(all_token_counts, dtype=np.int32)
+    print(f"✓ Logged {len(rewards_arr)} total trajectories across {steps_to_run} steps")
+    print(f"  Overall mean reward: {rewards_arr.mean():.3f}")
+    print(f"  Overall max reward: {rewards_arr.max():.3f}")
+    print(f"  Overall min reward: {rewards_arr.min():.3f}")
     print(f"  Overall accuracy: {correct_count}/{total_count} = {correct_count/total_count:.1%}")
-    print(f"  Token stats: mean={sum(all_token_counts)/len(all_token_counts):.0f}, max={max(all_token_counts)}")
+    print(f"  Token stats: mean={tokens_arr.mean():.0f}, max={tokens_arr.max()}")
 
     # Verify database
     import sqlite3
     conn = sqlite3.connect(str(db_path))
     conn.row_factory = sqlite3.Row
+    # Memory-map the db for the full-table verification scans
+    conn.execute("PRAGMA mmap_size=268435456")
 
     runs = conn.execute("SELECT * FROM runs").fetchall()
     rollouts_db = conn.execute("SELECT * FROM rollouts").fetchall()
@@ -221,10 +247,13 @@ async def test_rl_qwen3_8b():
     for s in steps_db:
         print(f"    Step {s['step']}: mean={s['reward_mean']:.3f}")
 
-    # Show sample outputs
+    # Show sample outputs; project and truncate in SQL so the ORDER BY never
+    # materializes full output_text blobs, and let an index drive the sort
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_traj_reward ON trajectories(reward)")
     print(f"\n  Top 5 trajectories by reward:")
     top_trajs = conn.execute(
-        "SELECT * FROM trajectories ORDER BY reward DESC LIMIT 5"
+        "SELECT reward, substr(output_text, 1, 201) AS output_text "
+        "FROM trajectories ORDER BY reward DESC LIMIT 5"
     ).fetchall()
     for i, traj in enumerate(top_trajs):
         text = traj['output_text']
@@ -236,7 +265,8 @@ async def test_rl_qwen3_8b():
     # Show worst trajectories for comparison
     print(f"\n  Bottom 3 trajectories by reward:")
     bottom_trajs = conn.execute(
-        "SELECT * FROM trajectories ORDER BY reward ASC LIMIT 3"
+        "SELECT reward, substr(output_text, 1, 151) AS output_text "
+        "FROM trajectories ORDER BY reward ASC LIMIT 3"
     ).fetchall()
     for i, traj in enumerate(bottom_trajs):
         text = traj['output_text']
@@ -252,13 +282,11 @@ async def test_rl_qwen3_8b():
     print(f"{'='*60}")
 
 
-def _std(values: list[float]) -> float:
-    """Compute standard deviation."""
-    if not values:
+def _std(values) -> float:
+    """Compute standard deviation of a sequence or ndarray in one C pass."""
+    if len(values) == 0:
         return 0.0
-    mean = sum(values) / len(values)
-    variance = sum((v - mean) ** 2 for v in values) / len(values)
-    return variance ** 0.5
+    return float(np.asarray(values, dtype=np.float64).std())
 
 
 async def _do_rollout(env, completer):
@@ -11,23 +11,48 @@ Requires TINKER_API_KEY environment variable.
 """
 
 import asyncio
-import math
 import os
 import sys
 import tempfile
+import threading
 from dataclasses import dataclass
 from pathlib import Path
 
+import numpy as np
+
 # Add geospot-vlm and master-tinker to path
 sys.path.insert(0, "/Users/sdan/Developer/geospot-vlm")
 sys.path.insert(0, "/Users/sdan/Developer/master-tinker")
 
+# Resolve the helpers used in the per-trajectory hot path once at import time
+# (guarded so the module still collects where geospot is not installed)
+try:
+    from geospot.envs import parse_geo_response
+except ImportError:  # pragma: no cover
+    parse_geo_response = None
+
+
+@dataclass(frozen=True)
+class _Config:
+    """Env-tunable test settings, read once at import instead of per use."""
+
+    num_groups: int = int(os.environ.get("TVIZ_NUM_GROUPS", os.environ.get("TVIZ_NUM_SAMPLES", "8")))
+    group_size: int = int(os.environ.get("TVIZ_GROUP_SIZE", "8"))  # trajectories per group
+    max_tokens: int = 256
+    traj_timeout_s: int = int(os.environ.get("TVIZ_TRAJ_TIMEOUT_S", "300"))
+    concurrency: int = int(os.environ.get("TVIZ_CONCURRENCY", "8"))
+    max_inflight_groups: int = int(os.environ.get("TVIZ_MAX_INFLIGHT_GROUPS", "4"))
+
+
+CFG = _Config()
+
 
 async def test_vlm_rl_qwen3vl_30b():
     """Run VLM RL rollouts with Qwen3-VL-30B on OSV-5M."""
     import tinker
+    from PIL import Image
     from geospot.datasets import iterate_samples, GeoSample
-    from geospot.renderers import get_renderer
+    from geospot.renderers import ImagePart, TextPart, get_renderer
     from geospot.envs import (
         SingleTurnGeoEnv,
         SingleTurnGeoEnvConfig,
@@ -56,10 +81,11 @@ async def test_vlm_rl_qwen3vl_30b():
     # Config
     model_name = "Qwen/Qwen3-VL-30B-A3B-Instruct"
     renderer_name = "qwen3_vl"
-    num_groups = int(os.environ.get("TVIZ_NUM_GROUPS", os.environ.get("TVIZ_NUM_SAMPLES", "8")))
-    group_size = int(os.environ.get("TVIZ_GROUP_SIZE", "8"))  # trajectories per group (GRPO-style)
-    max_tokens = 256
-    traj_timeout_s = int(os.environ.get("TVIZ_TRAJ_TIMEOUT_S", "300"))
+    num_groups = CFG.num_groups
+    group_size = CFG.group_size
+    max_tokens = CFG.max_tokens
+    traj_timeout_s = CFG.traj_timeout_s
+    concurrency = CFG.concurrency
 
     # Use persistent tviz directory (same as frontend reads from)
     tviz_dir = Path.home() / ".tviz"
@@ -105,6 +131,13 @@ async def test_vlm_rl_qwen3vl_30b():
             temperature=1.0,
         )
 
+        # Cap total in-flight sampling requests across trajectories
+        sem = asyncio.Semaphore(concurrency)
+
+        async def _bounded_trajectory(*args):
+            async with sem:
+                return await _run_single_trajectory(*args)
+
         # Stream samples from OSV-5M
         log(f"\n✓ Streaming from OSV-5M dataset...")
         sample_iter = iterate_samples(
@@ -116,17 +149,27 @@ async def test_vlm_rl_qwen3vl_30b():
 
         all_rollouts = []
         step = 0
+        max_inflight_groups = CFG.max_inflight_groups
 
-        for sample_idx, sample in enumerate(sample_iter):
-            if sample_idx >= num_groups:
-                break
-
+        async def _run_group(sample, sample_idx):
+            """Roll out one sample's group and assemble its rollout and metrics."""
             log(f"\n  Sample {sample_idx}: lat={sample.lat:.4f}, lon={sample.lon:.4f}")
             log(f"    Location: {sample.city or '?'}, {sample.region or '?'}, {sample.country or '?'}")
 
-            # Save image to temp directory
+            # Save a downsized display copy on a worker thread; the dashboard
+            # renders small, and the VLM below still sees the full-res image
             image_path = str(images_dir / f"sample_{sample_idx}.jpg")
-            sample.image.save(image_path)
+
+            def _save_thumbnail():
+                # Copy + LANCZOS downsample are the CPU-heavy half, so the
+                # whole pipeline runs on the worker thread, not just the save
+                thumb = sample.image.copy()
+                thumb.thumbnail((512, 512), Image.Resampling.LANCZOS)
+                thumb.save(
+                    image_path, format="JPEG", quality=85, optimize=True, progressive=True
+                )
+
+            await asyncio.to_thread(_save_thumbnail)
 
             # Ground truth
             gt = GeoLocation(
@@ -137,19 +180,40 @@ async def test_vlm_rl_qwen3vl_30b():
                 city=sample.city,
             )
 
-            # Run G trajectories for this image
-            trajectories = []
-            for traj_idx in range(group_size):
-                log(f"    Traj {traj_idx}: starting...")
-                try:
-                    traj_data = await asyncio.wait_for(
-                        _run_single_trajectory(
-                            sample, gt, renderer, completer, tokenizer, traj_idx
-                        ),
+            # Build the generation prompt once per sample: all G trajectories
+            # share it, so image preprocessing runs once instead of G times
+            messages = [
+                {
+                    "role": "user",
+                    "content": [
+                        ImagePart(type="image", image=sample.image),
+                        TextPart(type="text", text=SINGLE_TURN_PROMPT),
+                    ],
+                }
+            ]
+            model_input = renderer.build_generation_prompt(messages)
+            stop = renderer.get_stop_sequences()
+
+            # Run all G trajectories for this image concurrently; gather keeps
+            # result order, so the result index doubles as trajectory_idx
+            results = await asyncio.gather(
+                *(
+                    asyncio.wait_for(
+                        _bounded_trajectory(model_input, stop, gt, completer, tokenizer, i),
                         timeout=traj_timeout_s,
                     )
-                except asyncio.TimeoutError:
-                    log(f"    Traj {traj_idx}: timed out after {traj_timeout_s}s")
+                    for i in range(group_size)
+                ),
+                return_exceptions=True,
+            )
+
+            trajectories = []
+            for traj_idx, traj_data in enumerate(results):
+                if isinstance(traj_data, BaseException):
+                    if isinstance(traj_data, asyncio.TimeoutError):
+                        log(f"    Traj {traj_idx}: timed out after {traj_timeout_s}s")
+                    else:
+                        log(f"    Traj {traj_idx}: failed: {traj_data!r}")
                     traj_data = {
                         "trajectory_idx": traj_idx,
                         "reward": -0.1,
@@ -163,6 +227,31 @@ async def test_vlm_rl_qwen3vl_30b():
                 trajectories.append(traj_data)
                 log(f"    Traj {traj_idx}: reward={traj_data['reward']:.3f}, dist={traj_data.get('distance_km', '?')}km")
 
+            # Score the group's valid predictions with one vectorized haversine
+            # instead of a scalar math.sin/cos pass per trajectory
+            scored = [t for t in trajectories if t["pred_lat"] is not None]
+            if scored:
+                lats = np.array([t["pred_lat"] for t in scored])
+                lons = np.array([t["pred_lon"] for t in scored])
+                dlat = np.radians(lats - gt.lat)
+                dlon = np.radians(lons - gt.lon)
+                a = (
+                    np.sin(dlat / 2) ** 2
+                    + np.cos(np.radians(gt.lat)) * np.cos(np.radians(lats)) * np.sin(dlon / 2) ** 2
+                )
+                distances = 2 * 6371.0 * np.arcsin(np.sqrt(a))
+                for traj, dist in zip(scored, distances):
+                    distance_km = float(dist)
+                    # Simple linear distance reward: 1.0 at 0km, 0.0 at 5000km
+                    distance_reward = max(0.0, 1.0 - (distance_km / 5000))
+                    traj["reward"] = distance_reward
+                    traj["distance_km"] = distance_km
+                    traj["step_rewards"].update(
+                        distance_km=distance_km,
+                        distance_reward=distance_reward,
+                        total_reward=distance_reward,
+                    )
+
             # Compute aggregate metrics
             rewards = [t["reward"] for t in trajectories]
             mean_reward = sum(rewards) / len(rewards)
@@ -170,9 +259,7 @@ async def test_vlm_rl_qwen3vl_30b():
             grpo_advantages, grpo_adv_mean, grpo_adv_std = _compute_grpo_advantages(rewards)
             for traj, advantage in zip(trajectories, grpo_advantages):
                 traj["grpo_advantage"] = advantage
-                step_rewards = traj.get("step_rewards") or {}
-                step_rewards["grpo_advantage"] = advantage
-                traj["step_rewards"] = step_rewards
+                traj.setdefault("step_rewards", {})["grpo_advantage"] = advantage
 
             # Build rollout dict for tviz
             rollout = {
@@ -186,9 +273,6 @@ async def test_vlm_rl_qwen3vl_30b():
                 "mean_reward": mean_reward,
                 "best_reward": best_reward,
             }
-            all_rollouts.append(rollout)
-
-            # Log metrics for this step
             metrics = {
                 "reward_mean": mean_reward,
                 "reward_best": best_reward,
@@ -196,10 +280,70 @@ async def test_vlm_rl_qwen3vl_30b():
                 "grpo_adv_mean": grpo_adv_mean,
                 "grpo_adv_std": grpo_adv_std,
             }
-            logger.log_metrics(metrics, step=step)
-            logger.log_rollouts([rollout], step=step)
+            return rollout, metrics
+
+        pending_rollouts: list = []
+
+        def _log_finished(done_tasks):
+            for task in done_tasks:
+                rollout, metrics = task.result()
+                all_rollouts.append(rollout)
+                pending_rollouts.append((rollout, metrics))
+
+        def _flush_pending():
+            """Write all buffered groups as one training step - one transaction."""
+            nonlocal step
+            if not pending_rollouts:
+                return
+            rollouts = [r for r, _ in pending_rollouts]
+            group_metrics = [m for _, m in pending_rollouts]
+            logger.log_rollouts(rollouts, step=step)
+            logger.log_metrics({
+                "reward_mean": float(np.mean([m["reward_mean"] for m in group_metrics])),
+                "reward_best": max(m["reward_best"] for m in group_metrics),
+                "num_trajectories": sum(m["num_trajectories"] for m in group_metrics),
+                "grpo_adv_mean": float(np.mean([m["grpo_adv_mean"] for m in group_metrics])),
+                "grpo_adv_std": float(np.mean([m["grpo_adv_std"] for m in group_metrics])),
+            }, step=step)
+            pending_rollouts.clear()
             step += 1
 
+        # Prefetch samples on a background thread: iterate_samples does HTTP
+        # fetches and image decodes, so buffering a few ahead keeps the event
+        # loop from stalling on the iterator between groups
+        sample_queue: asyncio.Queue = asyncio.Queue(maxsize=4)
+        loop = asyncio.get_running_loop()
+
+        def _producer():
+            for sample_idx, sample in enumerate(sample_iter):
+                if sample_idx >= num_groups:
+                    break
+                asyncio.run_coroutine_threadsafe(sample_queue.put(sample), loop).result()
+            asyncio.run_coroutine_threadsafe(sample_queue.put(None), loop).result()
+
+        threading.Thread(target=_producer, daemon=True).start()
+
+        # Keep up to max_inflight_groups groups in flight; finished groups are
+        # buffered and flushed together, one SQLite transaction per step's
+        # worth of rollouts instead of one per sample
+        pending: set = set()
+        sample_idx = 0
+        while True:
+            sample = await sample_queue.get()
+            if sample is None:
+                break
+            pending.add(asyncio.create_task(_run_group(sample, sample_idx)))
+            sample_idx += 1
+            while len(pending) >= max_inflight_groups:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                _log_finished(done)
+            if len(pending_rollouts) >= max_inflight_groups:
+                _flush_pending()
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            _log_finished(done)
+        _flush_pending()
+
         logger.close()
         log(f"\n✓ Logged {len(all_rollouts)} rollouts, {len(all_rollouts) * group_size} trajectories")
 
@@ -208,16 +352,19 @@ async def test_vlm_rl_qwen3vl_30b():
         conn = sqlite3.connect(str(db_path))
         conn.row_factory = sqlite3.Row
 
-        runs = conn.execute("SELECT * FROM runs").fetchall()
-        rollouts_db = conn.execute("SELECT * FROM rollouts").fetchall()
-        trajectories_db = conn.execute("SELECT * FROM trajectories").fetchall()
+        # One statement with subquery counts; SELECT * would materialize and
+        # ship every row (including token/logprob text) just to count them
+        n_runs, n_rollouts, n_trajs = conn.execute(
+            "SELECT (SELECT count(*) FROM runs), (SELECT count(*) FROM rollouts), "
+            "(SELECT count(*) FROM trajectories)"
+        ).fetchone()
 
         log("\n" + "=" * 60)
         log("Database Verification")
         log("=" * 60)
-        log(f"  Runs: {len(runs)}")
-        log(f"  Rollouts: {len(rollouts_db)}")
-        log(f"  Trajectories: {len(trajectories_db)}")
+        log(f"  Runs: {n_runs}")
+        log(f"  Rollouts: {n_rollouts}")
+        log(f"  Trajectories: {n_trajs}")
 
         # Check vision-specific fields (filter for rollouts with image_path)
         sample_rollout = conn.execute("SELECT * FROM rollouts WHERE image_path IS NOT NULL LIMIT 1").fetchone()
@@ -244,70 +391,42 @@ async def test_vlm_rl_qwen3vl_30b():
 
 
 async def _run_single_trajectory(
-    sample,
+    model_input,
+    stop,
     gt,
-    renderer,
     completer,
     tokenizer,
     traj_idx: int,
 ) -> dict:
-    """Run a single trajectory and return tviz-formatted data."""
-    from geospot.envs import SINGLE_TURN_PROMPT, parse_geo_response, haversine_km
-
-    # Build prompt with image
-    from geospot.renderers import ImagePart, TextPart
-    messages = [
-        {
-            "role": "user",
-            "content": [
-                ImagePart(type="image", image=sample.image),
-                TextPart(type="text", text=SINGLE_TURN_PROMPT),
-            ],
-        }
-    ]
-    model_input = renderer.build_generation_prompt(messages)
-    stop = renderer.get_stop_sequences()
-
+    """Run one trajectory against a prebuilt prompt and return tviz-formatted data."""
     # Get model response
     action = await completer(model_input, stop)
     output_text = tokenizer.decode(action.tokens)
 
-    # Parse response
+    # Parse response; distance and reward are filled in by the group-level
+    # vectorized haversine pass once all trajectories are back
     parsed = parse_geo_response(output_text)
-
-    # Compute reward
     if parsed.location is not None:
-        distance_km = haversine_km(
-            parsed.location.lat, parsed.location.lon,
-            gt.lat, gt.lon
-        )
-        # Simple exponential distance reward
-        distance_reward = max(0, 1.0 - (distance_km / 5000))  # 1.0 at 0km, 0.0 at 5000km
-        reward = distance_reward
         pred_lat, pred_lon = parsed.location.lat, parsed.location.lon
         format_valid = True
     else:
-        # Format failure
-        distance_km = None
-        distance_reward = 0.0
-        reward = -0.1
         pred_lat, pred_lon = None, None
         format_valid = False
 
     return {
         "trajectory_idx": traj_idx,
-        "reward": reward,
+        "reward": -0.1,  # format-failure default; overwritten for valid predictions
         "output_text": output_text,
         "output_tokens": action.tokens,
         "logprobs": action.logprobs,
         "pred_lat": pred_lat,
         "pred_lon": pred_lon,
-        "distance_km": distance_km,
+        "distance_km": None,
         "step_rewards": {
             "format_valid": format_valid,
-            "distance_km": distance_km,
-            "distance_reward": distance_reward,
-            "total_reward": reward,
+            "distance_km": None,
+            "distance_reward": 0.0,
+            "total_reward": -0.1,
         },
     }
 
@@ -315,18 +434,9 @@ async def _run_single_trajectory(
 def _compute_grpo_advantages(rewards: list[float]) -> tuple[list[float], float, float]:
     if not rewards:
         return [], 0.0, 0.0
-    mean_reward = sum(rewards) / len(rewards)
-    advantages = [reward - mean_reward for reward in rewards]
-    adv_mean = sum(advantages) / len(advantages)
-    return advantages, adv_mean, _stddev(advantages)
-
-
-def _stddev(values: list[float]) -> float:
-    if not values:
-        return 0.0
-    mean = sum(values) / len(values)
-    variance = sum((value - mean) ** 2 for value in values) / len(values)
-    return math.sqrt(variance)
+    arr = np.asarray(rewards, dtype=np.float64)
+    advantages = arr - arr.mean()
+    return advantages.tolist(), float(advantages.mean()), float(advantages.std())
 
 
 if __name__ == "__main__":
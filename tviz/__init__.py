@@ -2,8 +2,20 @@
 tviz - Training visualization for Tinker.
 """
 
-from tviz.logger import TvizLogger
+from typing import TYPE_CHECKING
 
 __version__ = "0.2.3"
 
 __all__ = ["TvizLogger"]
+
+if TYPE_CHECKING:
+    from tviz.logger import TvizLogger
+
+
+def __getattr__(name: str):
+    # PEP 562 lazy import: `import tviz` stays free of submodule import cost
+    if name == "TvizLogger":
+        from tviz.logger import TvizLogger
+
+        return TvizLogger
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
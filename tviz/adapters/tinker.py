@@ -8,8 +8,15 @@ Tinker types (from tinker_cookbook/rl/types.py):
 - TokensWithLogprobs: tokens, maybe_logprobs
 """
 
+import math
+from itertools import chain
 from typing import Any, Protocol, Optional
 
+try:  # numpy is optional; the training stacks that feed this adapter have it
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
 
 # Protocol definitions matching actual tinker_cookbook types
 class TokensWithLogprobs(Protocol):
@@ -50,10 +57,11 @@ def extract_prompt_text(ob: Any) -> Optional[str]:
     if isinstance(ob, dict):
         # Check for common keys
         return ob.get("text") or ob.get("prompt") or ob.get("content")
-    if hasattr(ob, "text"):
-        return ob.text
-    if hasattr(ob, "prompt"):
-        return ob.prompt
+    # getattr with a default is one C-level probe; hasattr plus the access
+    # runs the attribute lookup (and its AttributeError) twice on a miss
+    text = getattr(ob, "text", None) or getattr(ob, "prompt", None)
+    if text is not None:
+        return text
     # Try to stringify as last resort
     try:
         return str(ob)
@@ -77,25 +85,18 @@ def from_tinker_trajectory(
     Returns:
         Dict compatible with tviz TrajectoryData
     """
-    logprobs = []
-    step_rewards = []
-    output_tokens = []
-    output_text_parts = []
-
-    for trans in traj.transitions:
-        # Collect logprobs from action
-        if trans.ac.maybe_logprobs is not None:
-            logprobs.extend(trans.ac.maybe_logprobs)
-
-        # Collect tokens
-        output_tokens.extend(trans.ac.tokens)
-
-        # Collect per-step rewards
-        step_rewards.append(trans.reward)
+    transitions = traj.transitions
+    output_tokens = list(chain.from_iterable(t.ac.tokens for t in transitions))
+    logprobs = list(
+        chain.from_iterable(
+            t.ac.maybe_logprobs for t in transitions if t.ac.maybe_logprobs is not None
+        )
+    )
+    step_rewards = [t.reward for t in transitions]
 
     # Compute total reward if not provided
     if total_reward is None:
-        total_reward = sum(step_rewards)
+        total_reward = math.fsum(step_rewards)
 
     return {
         "trajectory_idx": trajectory_idx,
@@ -112,6 +113,7 @@ def from_tinker_trajectory_group(
     group_idx: int = 0,
     prompt_text: Optional[str] = None,
     tokenizer: Optional[Any] = None,
+    decode_top_k: Optional[int] = None,
 ) -> dict:
     """
     Convert a Tinker TrajectoryGroup to tviz RolloutData dict.
@@ -121,6 +123,9 @@ def from_tinker_trajectory_group(
         group_idx: Index for this rollout group
         prompt_text: Optional prompt text (extracted from first trajectory if not provided)
         tokenizer: Optional tokenizer for decoding tokens to text
+        decode_top_k: Decode output_text only for the top-K trajectories by
+            reward (None decodes all). tokenizer.decode costs several ms per
+            trajectory, and the UI usually shows just the best few.
 
     Returns:
         Dict compatible with tviz RolloutData
@@ -133,9 +138,14 @@ def from_tinker_trajectory_group(
         for idx, traj in enumerate(group.trajectories_G)
     ]
 
-    # Decode output tokens if tokenizer provided
+    # Decode output tokens if tokenizer provided, optionally only the top-K
     if tokenizer is not None:
-        for traj_dict in trajectories:
+        to_decode = trajectories
+        if decode_top_k is not None:
+            to_decode = sorted(
+                trajectories, key=lambda t: t["reward"], reverse=True
+            )[:decode_top_k]
+        for traj_dict in to_decode:
             if traj_dict.get("output_tokens"):
                 try:
                     traj_dict["output_text"] = tokenizer.decode(traj_dict["output_tokens"])
@@ -148,10 +158,20 @@ def from_tinker_trajectory_group(
         if first_traj.transitions:
             prompt_text = extract_prompt_text(first_traj.transitions[0].ob)
 
-    # Calculate aggregate metrics
-    rewards = [t["reward"] for t in trajectories]
-    mean_reward = sum(rewards) / len(rewards) if rewards else 0.0
-    best_reward = max(rewards) if rewards else 0.0
+    # Calculate aggregate metrics in a single pass
+    if not trajectories:
+        mean_reward = 0.0
+        best_reward = 0.0
+    elif np is not None:
+        arr = np.fromiter(
+            (t["reward"] for t in trajectories), dtype=np.float64, count=len(trajectories)
+        )
+        mean_reward = float(arr.mean())
+        best_reward = float(arr.max())
+    else:
+        rewards = [t["reward"] for t in trajectories]
+        mean_reward = sum(rewards) / len(rewards)
+        best_reward = max(rewards)
 
     return {
         "group_idx": group_idx,
@@ -166,6 +186,7 @@ def from_tinker_batch(
     groups: list[TinkerTrajectoryGroup],
     prompts: Optional[list[str]] = None,
     tokenizer: Optional[Any] = None,
+    decode_top_k: Optional[int] = None,
 ) -> list[dict]:
     """
     Convert a batch of Tinker TrajectoryGroups to tviz format.
@@ -177,6 +198,8 @@ def from_tinker_batch(
         groups: List of TrajectoryGroup objects from prepare_minibatch
         prompts: Optional list of prompts (one per group)
         tokenizer: Optional tokenizer for decoding tokens to text
+        decode_top_k: Decode output_text only for each group's top-K
+            trajectories by reward (None decodes all)
 
     Returns:
         List of rollout dicts ready for logger.log_rollouts()
@@ -191,12 +214,24 @@ def from_tinker_batch(
         rollouts = from_tinker_batch(trajectory_groups, tokenizer=tokenizer)
         logger.log_rollouts(rollouts, step=i_batch)
     """
+    # Hoist the prompts check out of the loop: one branch instead of one per group
+    if prompts is None:
+        return [
+            from_tinker_trajectory_group(
+                group,
+                group_idx=idx,
+                tokenizer=tokenizer,
+                decode_top_k=decode_top_k,
+            )
+            for idx, group in enumerate(groups)
+        ]
     return [
         from_tinker_trajectory_group(
             group,
             group_idx=idx,
-            prompt_text=prompts[idx] if prompts else None,
+            prompt_text=prompts[idx],
             tokenizer=tokenizer,
+            decode_top_k=decode_top_k,
         )
         for idx, group in enumerate(groups)
     ]
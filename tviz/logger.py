@@ -7,11 +7,157 @@ added to MultiplexLogger alongside WandbLogger, NeptuneLogger, etc.
 
 import json
 import os
+import queue
 import sqlite3
-import uuid
+import threading
+import warnings
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Union
 
+# orjson encodes large numeric arrays several times faster than stdlib json
+# and handles numpy inputs natively; fall back to stdlib so the package keeps
+# zero hard dependencies. Both paths produce TEXT - the dashboard JSON.parses
+# these columns, so the storage format must stay JSON strings.
+try:
+    import orjson
+
+    def _json_dumps(value: Any) -> str:
+        return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY).decode()
+except ImportError:  # pragma: no cover
+    orjson = None
+
+    def _json_dumps(value: Any) -> str:
+        # Compact separators to match orjson's output and shave the
+        # whitespace stdlib json pads every extras/tokens blob with
+        return json.dumps(value, separators=(",", ":"))
+
+# numpy is optional for the same zero-dependency reason; used only to speed
+# up reward aggregation over large trajectory groups
+try:
+    import numpy as np
+
+    # Bind numpy scalars (rewards, losses, kl terms from training frameworks)
+    # straight to SQLite natives instead of raising "unsupported type";
+    # torch callers should .item() before logging
+    sqlite3.register_adapter(np.float32, float)
+    sqlite3.register_adapter(np.float64, float)
+    sqlite3.register_adapter(np.int32, int)
+    sqlite3.register_adapter(np.int64, int)
+except ImportError:  # pragma: no cover
+    np = None
+
+
+def _dump_json(value: Any) -> Optional[str]:
+    """Serialize a collection to JSON text, accepting numpy arrays; None/empty -> NULL."""
+    if value is None:
+        return None
+    if orjson is None:
+        tolist = getattr(value, "tolist", None)
+        if tolist is not None:
+            value = tolist()
+    if not _has_items(value):
+        return None
+    return _json_dumps(value)
+
+
+def _has_items(value: Any) -> bool:
+    """Truthiness that works for numpy arrays as well as lists/dicts."""
+    size = getattr(value, "size", None)
+    if size is not None:
+        return size > 0
+    return bool(value)
+
+
+# Bump when the schema script or the _ensure_step_columns migrations change
+_SCHEMA_VERSION = 2
+
+# Metric-name routing for log_metrics: canonical column -> accepted aliases,
+# in priority order. The reverse index below is built once at import so each
+# incoming key costs one dict lookup instead of a prefix sweep per column.
+_METRIC_ALIASES = {
+    "reward_mean": ("reward_mean", "reward", "reward/total"),
+    "reward_std": ("reward_std",),
+    "loss": ("loss",),
+    "kl_divergence": ("kl_divergence", "kl", "kl_sample_train", "kl_sample_train_v1"),
+    "entropy": ("entropy",),
+    "learning_rate": ("learning_rate", "lr"),
+    "ac_tokens_per_turn": ("ac_tokens_per_turn",),
+    "ob_tokens_per_turn": ("ob_tokens_per_turn",),
+    "total_ac_tokens": ("total_ac_tokens",),
+    "total_turns": ("total_turns",),
+    "sampling_time_mean": ("time/sampling_time_mean", "sampling_time_mean"),
+    "time_total": ("time/total", "time_total"),
+    "frac_mixed": ("frac_mixed",),
+    "frac_all_good": ("frac_all_good",),
+    "frac_all_bad": ("frac_all_bad",),
+}
+
+_METRIC_PREFIXES = ("env/all/", "optim/", "by_group/")
+
+
+def _build_metric_key_map() -> Dict[str, tuple]:
+    mapping: Dict[str, tuple] = {}
+    for canonical, aliases in _METRIC_ALIASES.items():
+        rank = 0
+        for alias in aliases:
+            for variant in (alias, *(prefix + alias for prefix in _METRIC_PREFIXES)):
+                mapping.setdefault(variant, (canonical, rank))
+                rank += 1
+    return mapping
+
+
+_METRIC_KEY_MAP = _build_metric_key_map()
+
+# SQL for the hot write paths, built once at import instead of per call
+# Upsert instead of INSERT OR REPLACE: a replace deletes the old row and
+# re-inserts (new rowid, every index rewritten); DO UPDATE edits it in place
+_SQL_INSERT_STEP = """
+    INSERT INTO steps
+    (run_id, step, reward_mean, reward_std, loss, kl_divergence, entropy, learning_rate,
+     ac_tokens_per_turn, ob_tokens_per_turn, total_ac_tokens, total_turns,
+     sampling_time_mean, time_total,
+     frac_mixed, frac_all_good, frac_all_bad, extras)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ON CONFLICT(run_id, step) DO UPDATE SET
+        reward_mean=excluded.reward_mean,
+        reward_std=excluded.reward_std,
+        loss=excluded.loss,
+        kl_divergence=excluded.kl_divergence,
+        entropy=excluded.entropy,
+        learning_rate=excluded.learning_rate,
+        ac_tokens_per_turn=excluded.ac_tokens_per_turn,
+        ob_tokens_per_turn=excluded.ob_tokens_per_turn,
+        total_ac_tokens=excluded.total_ac_tokens,
+        total_turns=excluded.total_turns,
+        sampling_time_mean=excluded.sampling_time_mean,
+        time_total=excluded.time_total,
+        frac_mixed=excluded.frac_mixed,
+        frac_all_good=excluded.frac_all_good,
+        frac_all_bad=excluded.frac_all_bad,
+        extras=excluded.extras
+"""
+
+# Rollout ids are pre-assigned client-side (see _insert_rollouts) so the
+# whole batch can bind through executemany without lastrowid round trips
+_SQL_INSERT_ROLLOUT = """
+    INSERT INTO rollouts
+    (id, run_id, step, group_idx, image_path, gt_lat, gt_lon, city, country,
+     prompt_text, prompt_tokens, mean_reward, best_reward)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_SQL_INSERT_TRAJECTORY = """
+    INSERT INTO trajectories
+    (rollout_id, trajectory_idx, reward, output_text, output_tokens, logprobs,
+     pred_lat, pred_lon, distance_km, step_rewards)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+_SQL_INSERT_RUN = "INSERT INTO runs (id, name, type, modality, config) VALUES (?, ?, ?, ?, ?)"
+
+_SQL_UPDATE_RUN_END = "UPDATE runs SET ended_at = CURRENT_TIMESTAMP WHERE id = ?"
+
+
 
 class TvizLogger:
     """
@@ -41,21 +187,63 @@ class TvizLogger:
         chosen_path = db_path or env_db_path or str(default_db_path)
         self.db_path = Path(chosen_path)
         self.db_path.parent.mkdir(parents=True, exist_ok=True)
-        self.run_id: str = str(uuid.uuid4())[:8]
+        # str() once; _get_conn and the schema sentinel reuse it
+        self._db_path_str = str(self.db_path)
+        # 8 hex chars of entropy, same shape as the old uuid4 slice but
+        # without constructing and formatting a full UUID
+        self.run_id: str = os.urandom(4).hex()
         self.run_name = run_name or self.run_id
         self.modality = modality
         self._conn: Optional[sqlite3.Connection] = None
         self._config_logged = False
+        self._closed = False
+        self._writer_error: Optional[Exception] = None
         self._ensure_schema()
+        # Writes are enqueued and applied by a background thread that
+        # coalesces bursts into one transaction, so log_* calls never block
+        # the training loop on commit latency. Durability window: anything
+        # queued but not yet flushed is lost if the process dies mid-run;
+        # sync() forces a flush and close() drains everything.
+        self._queue: queue.Queue = queue.Queue(maxsize=10_000)
+        self._writer = threading.Thread(target=self._writer_loop, name="tviz-writer", daemon=True)
+        self._writer.start()
 
     def _get_conn(self) -> sqlite3.Connection:
         if self._conn is None:
-            self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
-            self._conn.row_factory = sqlite3.Row
+            # isolation_level=None puts the connection in autocommit: no
+            # implicit BEGIN from the sqlite3 module, transactions exist only
+            # where the writer opens them explicitly
+            self._conn = sqlite3.connect(
+                self._db_path_str,
+                check_same_thread=False,
+                cached_statements=256,
+                isolation_level=None,
+            )
+            # No row_factory: this connection only writes, nothing reads rows
+            # WAL lets the dashboard read while training writes; NORMAL drops
+            # the per-commit fsync that dominates small-write latency
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.execute("PRAGMA temp_store=MEMORY")
+            # 64 MB page cache keeps hot index pages resident; busy_timeout
+            # waits out short dashboard read locks instead of raising
+            self._conn.execute("PRAGMA cache_size=-64000")
+            self._conn.execute("PRAGMA busy_timeout=5000")
+            # Memory-map up to 256 MB of the DB so page reads during index
+            # updates skip the read() syscall path
+            self._conn.execute("PRAGMA mmap_size=268435456")
         return self._conn
 
     def _ensure_schema(self) -> None:
         conn = self._get_conn()
+        # user_version persists in the DB file: once it matches, later opens
+        # skip parsing the whole CREATE script and the ALTER probes. No
+        # in-process cache on top - it would go stale if the DB file is
+        # deleted out from under a long-lived process, and the pragma is one
+        # round trip on a connection we open anyway.
+        version = conn.execute("PRAGMA user_version").fetchone()[0]
+        if version == _SCHEMA_VERSION:
+            return
         conn.executescript("""
             CREATE TABLE IF NOT EXISTS runs (
                 id TEXT PRIMARY KEY,
@@ -132,21 +320,105 @@ class TvizLogger:
             CREATE INDEX IF NOT EXISTS idx_rollouts_run_id ON rollouts(run_id);
             CREATE INDEX IF NOT EXISTS idx_rollouts_step ON rollouts(run_id, step);
             CREATE INDEX IF NOT EXISTS idx_trajectories_rollout ON trajectories(rollout_id);
+            -- Covers the dashboard's "trajectories for a rollout ordered by
+            -- trajectory_idx" listing without a table B-tree descent per row
+            CREATE INDEX IF NOT EXISTS idx_trajectories_rollout_idx
+                ON trajectories(rollout_id, trajectory_idx);
         """)
         self._ensure_step_columns(conn)
-        conn.commit()
+        conn.execute(f"PRAGMA user_version={_SCHEMA_VERSION}")
 
     def _ensure_step_columns(self, conn: sqlite3.Connection) -> None:
+        # Ask the catalog which columns exist instead of probing with ALTER
+        # and catching "duplicate column" - no exception machinery, and only
+        # genuinely missing columns spawn DDL
+        existing = {row[1] for row in conn.execute("PRAGMA table_info(steps)")}
         columns = [
-            "sampling_time_mean REAL",
-            "time_total REAL",
+            ("sampling_time_mean", "REAL"),
+            ("time_total", "REAL"),
         ]
-        for column_def in columns:
+        for name, col_type in columns:
+            if name not in existing:
+                conn.execute(f"ALTER TABLE steps ADD COLUMN {name} {col_type}")
+
+    # -------------------------------------------------------------------------
+    # Background writer
+    # -------------------------------------------------------------------------
+
+    _MAX_BATCH = 256
+
+    def _writer_loop(self) -> None:
+        """Drain queued writes, coalescing bursts into one transaction."""
+        conn = self._get_conn()
+        while True:
+            items = [self._queue.get()]
+            while len(items) < self._MAX_BATCH:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+
+            closing = False
+            flush_events = []
+            writes = []
+            for item in items:
+                if item is None:
+                    closing = True
+                elif item[0] == "sync":
+                    flush_events.append(item[1])
+                else:
+                    writes.append(item)
+
+            # A bad batch (unserializable payload, transient OperationalError)
+            # must not kill the thread: drop it, record the error for the next
+            # log_* call to re-raise, and keep draining - otherwise the queue
+            # fills and put() would block the training loop. The thread only
+            # exits via the close() sentinel, and sync events always fire so
+            # sync() can never hang on a failed flush.
             try:
-                conn.execute(f"ALTER TABLE steps ADD COLUMN {column_def}")
-            except sqlite3.OperationalError as exc:
-                if "duplicate column name" not in str(exc):
-                    raise
+                if writes:
+                    # Group homogeneous rows so a burst of steps is one
+                    # executemany instead of N execute calls. Runs go first: a
+                    # queued run insert always precedes rows referencing it,
+                    # and steps/rollouts do not depend on each other.
+                    run_rows = [p for k, p in writes if k == "run"]
+                    step_rows = [p for k, p in writes if k == "step"]
+                    conn.execute("BEGIN IMMEDIATE")
+                    try:
+                        if run_rows:
+                            conn.executemany(_SQL_INSERT_RUN, run_rows)
+                        if step_rows:
+                            conn.executemany(_SQL_INSERT_STEP, step_rows)
+                        for kind, payload in writes:
+                            if kind == "rollouts":
+                                self._insert_rollouts(conn, *payload)
+                    except Exception:
+                        conn.rollback()
+                        raise
+                    conn.commit()
+            except Exception as exc:
+                self._writer_error = exc
+            finally:
+                for event in flush_events:
+                    event.set()
+
+            if closing:
+                try:
+                    conn.execute(_SQL_UPDATE_RUN_END, (self.run_id,))
+                    # Refresh planner statistics while we still own the handle
+                    conn.execute("PRAGMA optimize")
+                    conn.close()
+                except Exception as exc:
+                    self._writer_error = exc
+                self._conn = None
+                return
+
+    def _check_writer_error(self) -> None:
+        """Re-raise an error recorded by the writer thread on the caller."""
+        exc = self._writer_error
+        if exc is not None:
+            self._writer_error = None
+            raise exc
 
     # -------------------------------------------------------------------------
     # Logger interface (tinker-cookbook compatible)
@@ -154,20 +426,24 @@ class TvizLogger:
 
     def log_hparams(self, config: Any) -> None:
         """Log hyperparameters/configuration. Creates the run."""
+        self._check_writer_error()
         if self._config_logged:
             return
 
-        conn = self._get_conn()
-        config_json = json.dumps(config) if config else None
-        conn.execute(
-            "INSERT INTO runs (id, name, type, modality, config) VALUES (?, ?, ?, ?, ?)",
-            (self.run_id, self.run_name, "rl", self.modality, config_json),
-        )
-        conn.commit()
+        # A str config is taken as already-serialized JSON; re-encoding it
+        # would wrap the whole payload in quotes
+        if not config:
+            config_json = None
+        elif isinstance(config, str):
+            config_json = config
+        else:
+            config_json = _json_dumps(config)
+        self._queue.put(("run", (self.run_id, self.run_name, "rl", self.modality, config_json)))
         self._config_logged = True
 
     def log_metrics(self, metrics: Dict[str, Any], step: Optional[int] = None) -> None:
         """Log scalar metrics for a training step."""
+        self._check_writer_error()
         # Auto-create run if not yet created
         if not self._config_logged:
             self.log_hparams({})
@@ -175,73 +451,46 @@ class TvizLogger:
         if step is None:
             return
 
-        # Extract known columns (support both flat and nested "env/all/" prefixed keys)
+        # Route known columns in one pass over the incoming keys (supporting
+        # flat and "env/all/" style prefixed aliases); the best-ranked alias
+        # wins its column and lower-priority duplicates stay in extras
         data = dict(metrics)
-
-        def pop_metric(*keys: str) -> Optional[float]:
-            """Pop first matching key, supporting nested prefixes."""
-            for key in keys:
-                if key in data:
-                    return data.pop(key)
-                # Also check with common prefixes
-                for prefix in ["env/all/", "optim/", "by_group/"]:
-                    prefixed = f"{prefix}{key}"
-                    if prefixed in data:
-                        return data.pop(prefixed)
-            return None
-
-        reward_mean = pop_metric("reward_mean", "reward", "reward/total")
-        reward_std = pop_metric("reward_std")
-        loss = pop_metric("loss")
-        kl_divergence = pop_metric("kl_divergence", "kl", "kl_sample_train", "kl_sample_train_v1")
-        entropy = pop_metric("entropy")
-        learning_rate = pop_metric("learning_rate", "lr")
-
-        # Token metrics (tinker-cookbook)
-        ac_tokens_per_turn = pop_metric("ac_tokens_per_turn")
-        ob_tokens_per_turn = pop_metric("ob_tokens_per_turn")
-        total_ac_tokens = pop_metric("total_ac_tokens")
-        total_turns = pop_metric("total_turns")
-        sampling_time_mean = pop_metric("time/sampling_time_mean", "sampling_time_mean")
-        time_total = pop_metric("time/total", "time_total")
-
-        # Group analysis metrics (tinker-cookbook GRPO)
-        frac_mixed = pop_metric("frac_mixed")
-        frac_all_good = pop_metric("frac_all_good")
-        frac_all_bad = pop_metric("frac_all_bad")
-
-        conn = self._get_conn()
-        conn.execute(
-            """
-            INSERT OR REPLACE INTO steps
-            (run_id, step, reward_mean, reward_std, loss, kl_divergence, entropy, learning_rate,
-             ac_tokens_per_turn, ob_tokens_per_turn, total_ac_tokens, total_turns,
-             sampling_time_mean, time_total,
-             frac_mixed, frac_all_good, frac_all_bad, extras)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-            """,
+        best: Dict[str, tuple] = {}
+        for key in data:
+            hit = _METRIC_KEY_MAP.get(key)
+            if hit is not None:
+                canonical, rank = hit
+                current = best.get(canonical)
+                if current is None or rank < current[0]:
+                    best[canonical] = (rank, key)
+        columns = {canonical: data.pop(key) for canonical, (_, key) in best.items()}
+
+        total_ac_tokens = columns.get("total_ac_tokens")
+        total_turns = columns.get("total_turns")
+
+        self._queue.put((
+            "step",
             (
                 self.run_id,
                 step,
-                reward_mean,
-                reward_std,
-                loss,
-                kl_divergence,
-                entropy,
-                learning_rate,
-                ac_tokens_per_turn,
-                ob_tokens_per_turn,
+                columns.get("reward_mean"),
+                columns.get("reward_std"),
+                columns.get("loss"),
+                columns.get("kl_divergence"),
+                columns.get("entropy"),
+                columns.get("learning_rate"),
+                columns.get("ac_tokens_per_turn"),
+                columns.get("ob_tokens_per_turn"),
                 int(total_ac_tokens) if total_ac_tokens else None,
                 int(total_turns) if total_turns else None,
-                sampling_time_mean,
-                time_total,
-                frac_mixed,
-                frac_all_good,
-                frac_all_bad,
-                json.dumps(data) if data else None,
+                columns.get("sampling_time_mean"),
+                columns.get("time_total"),
+                columns.get("frac_mixed"),
+                columns.get("frac_all_good"),
+                columns.get("frac_all_bad"),
+                _json_dumps(data) if data else None,
             ),
-        )
-        conn.commit()
+        ))
 
     def log_rollouts(self, rollouts: List[Dict], step: int) -> None:
         """
@@ -253,79 +502,110 @@ class TvizLogger:
             - image_path: str (for vision modality)
             - trajectories: list of dicts with reward, output_text, etc.
         """
+        self._check_writer_error()
         if not self._config_logged:
             self.log_hparams({})
 
-        conn = self._get_conn()
-
-        for rollout in rollouts:
+        # Row building and JSON encoding happen on the writer thread, so the
+        # caller returns as soon as the batch is queued
+        self._queue.put(("rollouts", (rollouts, step)))
+
+    def _insert_rollouts(self, conn: sqlite3.Connection, rollouts: List[Dict], step: int) -> None:
+        # Memoize serialized values by object identity for the duration of
+        # this batch: GRPO callers often share one tokens list or rewards
+        # dict across a group, and identical objects encode once
+        cache: Dict[int, Optional[str]] = {}
+
+        def dump_cached(obj: Any) -> Optional[str]:
+            if obj is None:
+                return None
+            key = id(obj)
+            if key not in cache:
+                cache[key] = _dump_json(obj)
+            return cache[key]
+
+        # Pre-assign rollout ids inside the open transaction (the write lock
+        # is held, so no other writer can interleave): with ids known up
+        # front, all rollout rows and all trajectory rows across the whole
+        # batch bind through two executemany calls instead of a per-rollout
+        # execute/lastrowid round trip
+        next_id = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM rollouts").fetchone()[0]
+
+        rollout_rows = []
+        traj_rows = []
+        for rollout_id, rollout in enumerate(rollouts, start=next_id):
             trajectories = rollout.get("trajectories", [])
-            rewards = [t.get("reward", 0) for t in trajectories]
-            mean_reward = sum(rewards) / len(rewards) if rewards else None
-            best_reward = max(rewards) if rewards else None
-
-            cursor = conn.execute(
-                """
-                INSERT INTO rollouts
-                (run_id, step, group_idx, image_path, gt_lat, gt_lon, city, country,
-                 prompt_text, prompt_tokens, mean_reward, best_reward)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """,
+            n_traj = len(trajectories)
+            if n_traj == 0:
+                mean_reward = best_reward = None
+            elif np is not None and n_traj >= 16:
+                # One pass, no intermediate list; pays off for GRPO-sized groups
+                arr = np.fromiter(
+                    (t.get("reward", 0.0) for t in trajectories), dtype=np.float32, count=n_traj
+                )
+                mean_reward = float(arr.mean())
+                best_reward = float(arr.max())
+            else:
+                rewards = [t.get("reward", 0) for t in trajectories]
+                mean_reward = sum(rewards) / n_traj
+                best_reward = max(rewards)
+
+            rollout_rows.append((
+                rollout_id,
+                self.run_id,
+                step,
+                rollout.get("group_idx", 0),
+                rollout.get("image_path"),
+                rollout.get("gt_lat"),
+                rollout.get("gt_lon"),
+                rollout.get("city"),
+                rollout.get("country"),
+                rollout.get("prompt_text"),
+                dump_cached(rollout.get("prompt_tokens")),
+                mean_reward,
+                best_reward,
+            ))
+            traj_rows.extend(
                 (
-                    self.run_id,
-                    step,
-                    rollout.get("group_idx", 0),
-                    rollout.get("image_path"),
-                    rollout.get("gt_lat"),
-                    rollout.get("gt_lon"),
-                    rollout.get("city"),
-                    rollout.get("country"),
-                    rollout.get("prompt_text"),
-                    json.dumps(rollout.get("prompt_tokens")) if rollout.get("prompt_tokens") else None,
-                    mean_reward,
-                    best_reward,
-                ),
-            )
-            rollout_id = cursor.lastrowid
-
-            for traj in trajectories:
-                conn.execute(
-                    """
-                    INSERT INTO trajectories
-                    (rollout_id, trajectory_idx, reward, output_text, output_tokens, logprobs,
-                     pred_lat, pred_lon, distance_km, step_rewards)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    """,
-                    (
-                        rollout_id,
-                        traj.get("trajectory_idx", 0),
-                        traj.get("reward", 0.0),
-                        traj.get("output_text"),
-                        json.dumps(traj.get("output_tokens")) if traj.get("output_tokens") else None,
-                        json.dumps(traj.get("logprobs")) if traj.get("logprobs") else None,
-                        traj.get("pred_lat"),
-                        traj.get("pred_lon"),
-                        traj.get("distance_km"),
-                        json.dumps(traj.get("step_rewards")) if traj.get("step_rewards") else None,
-                    ),
+                    rollout_id,
+                    traj.get("trajectory_idx", 0),
+                    traj.get("reward", 0.0),
+                    traj.get("output_text"),
+                    dump_cached(traj.get("output_tokens")),
+                    dump_cached(traj.get("logprobs")),
+                    traj.get("pred_lat"),
+                    traj.get("pred_lon"),
+                    traj.get("distance_km"),
+                    dump_cached(traj.get("step_rewards")),
                 )
+                for traj in trajectories
+            )
 
-        conn.commit()
+        conn.executemany(_SQL_INSERT_ROLLOUT, rollout_rows)
+        if traj_rows:
+            conn.executemany(_SQL_INSERT_TRAJECTORY, traj_rows)
 
     def close(self) -> None:
-        """Mark run as complete and close connection."""
-        if self._conn is not None:
-            self._conn.execute(
-                "UPDATE runs SET ended_at = CURRENT_TIMESTAMP WHERE id = ?",
-                (self.run_id,),
-            )
-            self._conn.commit()
-            self._conn.close()
-            self._conn = None
+        """Flush pending writes, mark run as complete, and stop the writer."""
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._writer.join()
+        # Close still completes shutdown on a failed flush; surface the loss
+        # without raising out of teardown
+        if self._writer_error is not None:
+            warnings.warn(f"tviz: writer thread error, some writes were lost: {self._writer_error!r}")
+            self._writer_error = None
 
     def sync(self) -> None:
-        """Force sync (no-op for SQLite, included for interface compat)."""
-        pass
+        """Block until every write queued so far has been committed."""
+        if self._closed:
+            return
+        flushed = threading.Event()
+        self._queue.put(("sync", flushed))
+        flushed.wait()
+        self._check_writer_error()
 
     def get_logger_url(self) -> Optional[str]:
         """Return URL to view this run (local dashboard)."""